@@ -3,6 +3,7 @@ import configparser
 import configurator
 import importlib
 import sys
+import tools.tracing
 
 __setup_ini_file_name = "setup.ini"
 
@@ -24,6 +25,22 @@ def __main__():
 		nargs=1,
 		help="configuration name"
 	)
+	parser.add_argument(
+		"--plan",
+		action="store_true",
+		help="print the changes an update would make without applying them"
+	)
+	parser.add_argument(
+		"--trace",
+		metavar="file",
+		type=str,
+		help="write a Chrome trace-event file of the run"
+	)
+	parser.add_argument(
+		"--spans",
+		action="store_true",
+		help="break the timing summary of each phase down by span"
+	)
 	args = parser.parse_args(sys.argv[1:])
 	prov_name = args.provider[0]
 	config_name = args.configuration[0]
@@ -44,9 +61,15 @@ def __main__():
 			with prov.Updater(
 				configurator.Configurator(setup_ini[config_name])
 			) as updater:
-				updater.update()
+				if args.plan:
+					updater.plan()
+				else:
+					updater.update()
 		finally:
 			setup_ini.write(setup_ini_file)
+			print(tools.tracing.tracer.summary(args.spans))
+			if args.trace is not None:
+				tools.tracing.tracer.write_chrome_trace(args.trace)
 			
 __main__()
 
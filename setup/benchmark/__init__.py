@@ -0,0 +1,282 @@
+import contextlib
+import io
+import os
+import paramiko
+import shutil
+import sys
+import tempfile
+import time
+import urllib3
+
+import tools.artifacts.maven
+import tools.glassfish
+import tools.glassfish.state
+import tools.tracing
+
+from benchmark import docker, glassfish, rest, ssh
+
+class Environment:
+
+	def __init__(self, rest_latency=0.0, jvm_startup=0.0, golden_images=False,
+			warm_pool_size=0, artifact_size=1 << 20):
+		self.__golden_images = golden_images
+		self.__warm_pool_size = warm_pool_size
+		self.__home = tempfile.TemporaryDirectory()
+		self.__saved_environ = {
+			name: os.environ.get(name)
+			for name in ("HOME", "REQUESTS_CA_BUNDLE", "CURL_CA_BUNDLE")
+		}
+		os.environ["HOME"] = self.__home.name
+		os.environ.pop("REQUESTS_CA_BUNDLE", None)
+		os.environ.pop("CURL_CA_BUNDLE", None)
+		self.__private_key_path = os.path.join(self.__home.name, "id_rsa")
+		self.__public_key_path = os.path.join(self.__home.name, "id_rsa.pub")
+		key = paramiko.RSAKey.generate(2048)
+		key.write_private_key_file(self.__private_key_path)
+		with open(self.__public_key_path, "w") as f:
+			f.write("{} {}\n".format(key.get_name(), key.get_base64()))
+		self.__artifact_path = os.path.join(self.__home.name, "bench.war")
+		self.__artifact_size = artifact_size
+		self.rebuild_artifact()
+		self.__build_context = os.path.join(self.__home.name, "docker-glassfish")
+		for image_type in ("debian", "server"):
+			image_path = os.path.join(
+				self.__build_context,
+				"image",
+				"glassfish-4.1.1-{}".format(image_type)
+			)
+			os.makedirs(image_path)
+			with open(os.path.join(image_path, "Dockerfile"), "w") as f:
+				f.write("FROM scratch\n")
+		self.counters = glassfish.Counters()
+		self.domain = glassfish.FakeDomain(self.counters)
+		self.rest = rest.FakeRestServer(self.domain, rest_latency)
+		self.http = rest.FakeInstanceServer(self.domain)
+		self.ssh = ssh.FakeSSHHost(
+			self.domain,
+			self.rest.server_address,
+			jvm_startup
+		)
+		self.docker_client = docker.FakeAPIClient(self.counters)
+
+	@property
+	def public_key_path(self):
+		return self.__public_key_path
+
+	@property
+	def private_key_path(self):
+		return self.__private_key_path
+
+	@property
+	def build_context(self):
+		return self.__build_context
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, tp):
+		self.close()
+
+	def agent(self):
+		return tools.glassfish.restore(
+			"docker",
+			{
+				"docker-client": self.docker_client,
+				"image-version": "latest",
+				"container-prefix": "pto-bench",
+				"ssh-port": self.ssh.port,
+				"golden-images": self.__golden_images,
+				"warm-pool-size": self.__warm_pool_size
+			},
+			self.__public_key_path,
+			self.__private_key_path,
+			"masterpassword",
+			log_out=io.StringIO()
+		)
+
+	def install_artifact(self, group_id, artifact_id, version, packaging):
+		artifact_dir = os.path.join(
+			self.__home.name,
+			".m2",
+			"repository",
+			*group_id.split("."),
+			artifact_id
+		)
+		os.makedirs(os.path.join(artifact_dir, version), exist_ok=True)
+		shutil.copyfile(self.__artifact_path, os.path.join(
+			artifact_dir,
+			version,
+			"{}-{}.{}".format(artifact_id, version, packaging)
+		))
+		with open(os.path.join(artifact_dir, "maven-metadata-local.xml"),
+				"w") as f:
+			f.write(
+				"<metadata><groupId>{}</groupId><artifactId>{}</artifactId>"
+				"<versioning><versions><version>{}</version></versions>"
+				"</versioning></metadata>\n".format(
+					group_id,
+					artifact_id,
+					version
+				)
+			)
+
+	def rebuild_artifact(self):
+		with open(self.__artifact_path, "wb") as f:
+			f.write(os.urandom(self.__artifact_size))
+
+	def desired_state(self, node_count, batch_size=None):
+		desired = tools.glassfish.state.DesiredState()
+		cluster = tools.glassfish.state.DesiredCluster("cluster-01")
+		cluster.set_config("java-config", "debugEnabled", "true")
+		for i in range(1, node_count + 1):
+			node_name = "node-{:02d}".format(i)
+			desired.add_node(node_name)
+			cluster.add_instance("inst-{:02d}".format(i), node_name)
+		cluster.add_deployment(tools.glassfish.state.Deployment(
+			"bench",
+			tools.artifacts.maven.LocalArtifact(self.__artifact_path),
+			context_root="/bench",
+			batch_size=batch_size
+		))
+		desired.add_cluster(cluster)
+		return desired
+
+	def close(self):
+		self.ssh.close()
+		self.http.close()
+		self.rest.close()
+		for name, value in self.__saved_environ.items():
+			if value is None:
+				os.environ.pop(name, None)
+			else:
+				os.environ[name] = value
+		self.__home.cleanup()
+
+class Result:
+
+	def __init__(self, node_count, provision_time, replan_time, replan_changes,
+			redeploy_time, counts, summary):
+		self.__node_count = node_count
+		self.__provision_time = provision_time
+		self.__replan_time = replan_time
+		self.__replan_changes = replan_changes
+		self.__redeploy_time = redeploy_time
+		self.__counts = counts
+		self.__summary = summary
+
+	@property
+	def node_count(self):
+		return self.__node_count
+
+	@property
+	def provision_time(self):
+		return self.__provision_time
+
+	@property
+	def replan_time(self):
+		return self.__replan_time
+
+	@property
+	def replan_changes(self):
+		return self.__replan_changes
+
+	@property
+	def redeploy_time(self):
+		return self.__redeploy_time
+
+	@property
+	def counts(self):
+		return self.__counts
+
+	@property
+	def summary(self):
+		return self.__summary
+
+	def __str__(self):
+		lines = [
+			"{} node(s): provision {:.3f}s, replan {:.3f}s ({} change(s))".format(
+				self.__node_count,
+				self.__provision_time,
+				self.__replan_time,
+				self.__replan_changes
+			)
+		]
+		if self.__redeploy_time is not None:
+			lines.append("  rolling redeploy {:.3f}s".format(
+				self.__redeploy_time
+			))
+		lines.extend(
+			"  {:<32} {:>8}".format(name, count)
+			for name, count in sorted(self.__counts.items())
+		)
+		lines.append(self.__summary)
+		return "\n".join(lines)
+
+def run(node_count, rest_latency=0.0, jvm_startup=0.0, golden_images=False,
+		warm_pool_size=0, rolling_batch_size=0):
+	urllib3.disable_warnings()
+	tools.tracing.tracer = tools.tracing.Tracer()
+	with Environment(
+		rest_latency,
+		jvm_startup,
+		golden_images,
+		warm_pool_size
+	) as env:
+		with contextlib.redirect_stdout(io.StringIO()):
+			started = time.perf_counter()
+			with env.agent() as agent:
+				created_domain = agent.create_domain(
+					"admin",
+					"adminadmin",
+					"bench"
+				)
+				with created_domain.manage(
+					"admin",
+					"adminadmin"
+				) as mgd_domain:
+					tools.glassfish.state.plan(
+						mgd_domain,
+						env.desired_state(node_count)
+					).execute()
+					provisioned = time.perf_counter()
+					mgd_domain.topology(refresh=True)
+					replan = tools.glassfish.state.plan(
+						mgd_domain,
+						env.desired_state(node_count)
+					)
+					replanned = time.perf_counter()
+					redeploy_time = None
+					if rolling_batch_size > 0:
+						env.rebuild_artifact()
+						tools.glassfish.state.plan(
+							mgd_domain,
+							env.desired_state(node_count, rolling_batch_size)
+						).execute()
+						redeploy_time = time.perf_counter() - replanned
+		return Result(
+			node_count,
+			provisioned - started,
+			replanned - provisioned,
+			len(replan),
+			redeploy_time,
+			env.counters.snapshot(),
+			tools.tracing.tracer.summary(spans=True)
+		)
+
+def suite(node_counts=(1, 10, 50), rest_latency=0.0, jvm_startup=0.0,
+		golden_images=False, warm_pool_size=0, rolling_batch_size=0,
+		out=sys.stdout):
+	results = []
+	for node_count in node_counts:
+		result = run(
+			node_count,
+			rest_latency,
+			jvm_startup,
+			golden_images,
+			warm_pool_size,
+			rolling_batch_size
+		)
+		out.write("{}\n\n".format(result))
+		out.flush()
+		results.append(result)
+	return results
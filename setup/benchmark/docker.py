@@ -0,0 +1,187 @@
+import docker.errors
+import itertools
+import json
+import queue
+import threading
+import time
+
+class FakeEventStream:
+
+	def __init__(self):
+		self.__queue = queue.Queue()
+
+	def publish(self, event):
+		self.__queue.put(event)
+
+	def __iter__(self):
+		event = self.__queue.get()
+		while event is not None:
+			yield event
+			event = self.__queue.get()
+
+	def close(self):
+		self.__queue.put(None)
+
+class FakeAPIClient:
+
+	def __init__(self, counters):
+		self.__counters = counters
+		self.__lock = threading.Lock()
+		self.__containers = {}
+		self.__ids = itertools.count(1)
+		self.__addresses = itertools.count(1)
+		self.__streams = []
+		self.__images = {}
+		self.__execs = {}
+
+	def __count(self, name):
+		self.__counters.add("docker.{}".format(name))
+
+	def __matches(self, cont, filters):
+		name = filters.get("name")
+		if name is not None and not any(
+			name in cont_name
+			for cont_name in cont["Names"]
+		):
+			return False
+		cont_id = filters.get("id")
+		if cont_id is not None and not cont["Id"].startswith(cont_id):
+			return False
+		return True
+
+	def __publish(self, cont, action):
+		event = {
+			"Type": "container",
+			"Action": action,
+			"Actor": {
+				"ID": cont["Id"],
+				"Attributes": {
+					"name": cont["Names"][0].lstrip("/")
+				}
+			}
+		}
+		for stream in self.__streams:
+			stream.publish(event)
+
+	def events(self, decode=False, filters=None):
+		self.__count("events")
+		stream = FakeEventStream()
+		with self.__lock:
+			self.__streams.append(stream)
+		return stream
+
+	def containers(self, all=False, filters=None):
+		self.__count("containers")
+		with self.__lock:
+			return [
+				json.loads(json.dumps(cont))
+				for cont in self.__containers.values()
+				if (all or cont["State"] == "running")
+				and self.__matches(cont, filters or {})
+			]
+
+	def create_host_config(self, **kwargs):
+		return dict(kwargs)
+
+	def create_container(self, image, name, environment=None, labels=None,
+			host_config=None, **kwargs):
+		self.__count("create_container")
+		with self.__lock:
+			cont_id = "{:064x}".format(next(self.__ids))
+			self.__containers[cont_id] = {
+				"Id": cont_id,
+				"Names": [ "/{}".format(name) ],
+				"Image": image,
+				"Labels": dict(labels or {}),
+				"HostConfig": {
+					"Binds": host_config.get("binds") if host_config else None
+				},
+				"State": "created",
+				"Created": int(time.time()),
+				"NetworkSettings": {
+					"Networks": {
+						"bridge": {
+							"IPAddress": ""
+						}
+					}
+				}
+			}
+		return { "Id": cont_id }
+
+	def start(self, container):
+		self.__count("start")
+		with self.__lock:
+			cont = self.__containers[container]
+			cont["State"] = "running"
+			network = cont["NetworkSettings"]["Networks"]["bridge"]
+			if len(network["IPAddress"]) == 0:
+				address = next(self.__addresses)
+				network["IPAddress"] = "127.0.{}.{}".format(
+					1 + address // 254,
+					1 + address % 254
+				)
+			self.__publish(cont, "start")
+			self.__publish(cont, "health_status: healthy")
+
+	def rename(self, container, name):
+		self.__count("rename")
+		with self.__lock:
+			self.__containers[container]["Names"] = [ "/{}".format(name) ]
+
+	def remove_container(self, container, force=False):
+		self.__count("remove_container")
+		with self.__lock:
+			del self.__containers[container]
+
+	def inspect_image(self, image):
+		self.__count("inspect_image")
+		with self.__lock:
+			if image not in self.__images:
+				raise docker.errors.NotFound("No such image: {}".format(image))
+			return json.loads(json.dumps(self.__images[image]))
+
+	def commit(self, container, repository=None, tag=None, changes=None,
+			**kwargs):
+		self.__count("commit")
+		labels = {}
+		for change in (changes or "").splitlines():
+			if change.startswith("LABEL "):
+				name, value = change[len("LABEL "):].split("=", 1)
+				labels[name] = value
+		with self.__lock:
+			self.__containers[container]
+			self.__images["{}:{}".format(repository, tag)] = {
+				"Config": {
+					"Labels": labels
+				}
+			}
+
+	def exec_create(self, container, cmd, user=""):
+		self.__count("exec_create")
+		with self.__lock:
+			self.__containers[container]
+			exec_id = "{:064x}".format(next(self.__ids))
+			self.__execs[exec_id] = 0
+		return { "Id": exec_id }
+
+	def exec_start(self, exec_id):
+		return b""
+
+	def exec_inspect(self, exec_id):
+		with self.__lock:
+			return { "ExitCode": self.__execs[exec_id["Id"]] }
+
+	def build(self, path=None, tag=None, rm=False, labels=None, **kwargs):
+		self.__count("build")
+		with self.__lock:
+			self.__images[tag] = {
+				"Config": {
+					"Labels": labels
+				}
+			}
+		yield json.dumps({
+			"stream": "Successfully built {}\n".format(tag)
+		}).encode("UTF-8")
+
+	def close(self):
+		pass
@@ -0,0 +1,87 @@
+import asyncio
+import contextlib
+import io
+
+from benchmark import Environment
+from tools.glassfish import fleet
+
+class SharedHostAgent:
+
+	def __init__(self, agent, copies):
+		self.__agent = agent
+		self.__copies = copies
+
+	def domains(self):
+		domains = list(self.__agent.domains())
+		return [
+			d
+			for i in range(self.__copies)
+			for d in domains
+		]
+
+	def close(self):
+		self.__agent.close()
+
+def __expect(reports, instance_counts, copies):
+	found = {}
+	for report in reports:
+		if report.error is not None:
+			raise AssertionError(str(report))
+		found.setdefault(report.environment, []).append(report)
+	if sorted(found) != sorted(instance_counts):
+		raise AssertionError("Expected reports for {}, found {}".format(
+			", ".join(sorted(instance_counts)),
+			", ".join(sorted(found))
+		))
+	for env_name, instance_count in instance_counts.items():
+		if len(found[env_name]) != copies:
+			raise AssertionError("Expected {} report(s) for {}, found {}"
+				.format(copies, env_name, len(found[env_name])))
+		for report in found[env_name]:
+			states = report.instance_states.get("cluster-01", {})
+			running = [
+				inst_name
+				for inst_name, inst_state in states.items()
+				if inst_state == "RUNNING"
+			]
+			if len(report.nodes) != instance_count \
+					or len(running) != instance_count:
+				raise AssertionError("Expected {} running instance(s) in {}, "
+					"found:\n{}".format(instance_count, env_name, report))
+
+def check(instance_counts=(2, 3), host_limit=1, rounds=2):
+	envs = {
+		"env-{:02d}".format(i): Environment()
+		for i in range(1, len(instance_counts) + 1)
+	}
+	counts = dict(zip(envs, instance_counts))
+	copies = host_limit + 1
+	try:
+		agents = {}
+		with contextlib.redirect_stdout(io.StringIO()):
+			for env_name, env in envs.items():
+				agent = env.agent()
+				agents[env_name] = SharedHostAgent(agent, copies)
+				agent.create_domain("admin", "adminadmin", "bench")
+		with fleet.Fleet(
+			agents,
+			"admin",
+			"adminadmin",
+			host_limit=host_limit
+		) as domain_fleet:
+			for i in range(rounds):
+				with contextlib.redirect_stdout(io.StringIO()):
+					updated = asyncio.run(domain_fleet.update({
+						env_name: {
+							"bench": env.desired_state(counts[env_name])
+						}
+						for env_name, env in envs.items()
+					}))
+				__expect(updated, counts, copies)
+				with contextlib.redirect_stdout(io.StringIO()):
+					reported = asyncio.run(domain_fleet.report())
+				__expect(reported, counts, copies)
+	finally:
+		for env in reversed(list(envs.values())):
+			env.close()
+	return "\n".join(str(report) for report in reported)
@@ -0,0 +1,179 @@
+import collections
+import threading
+
+class Counters:
+
+	def __init__(self):
+		self.__lock = threading.Lock()
+		self.__counts = collections.Counter()
+
+	def add(self, name, count=1):
+		with self.__lock:
+			self.__counts[name] += count
+
+	def snapshot(self):
+		with self.__lock:
+			return collections.Counter(self.__counts)
+
+class FakeDomain:
+
+	def __init__(self, counters):
+		self.__lock = threading.RLock()
+		self.counters = counters
+		self.name = None
+		self.admin_host = None
+		self.admin_port = None
+		self.running = False
+		self.nodes = {}
+		self.clusters = {}
+		self.servers = {}
+		self.configs = {
+			"server-config": {
+				"java-config": {
+					"debugEnabled": "false"
+				}
+			}
+		}
+		self.applications = {}
+		self.http_port = None
+
+	@property
+	def lock(self):
+		return self.__lock
+
+	def create(self, name, admin_host, admin_port):
+		with self.__lock:
+			self.name = name
+			self.admin_host = admin_host
+			self.admin_port = admin_port
+			self.servers["server"] = {
+				"name": "server",
+				"nodeRef": "localhost-{}".format(name),
+				"configRef": "server-config",
+				"status": "RUNNING"
+			}
+
+	def create_node(self, name, host):
+		with self.__lock:
+			self.nodes[name] = {
+				"name": name,
+				"nodeHost": host,
+				"type": "SSH"
+			}
+
+	def create_cluster(self, name):
+		with self.__lock:
+			config_ref = "{}-config".format(name)
+			self.clusters[name] = {
+				"name": name,
+				"configRef": config_ref
+			}
+			self.configs[config_ref] = {
+				"java-config": {
+					"debugEnabled": "false"
+				}
+			}
+
+	def create_instance(self, name, node_name, cluster_name):
+		with self.__lock:
+			self.servers[name] = {
+				"name": name,
+				"nodeRef": node_name,
+				"configRef": self.clusters[cluster_name]["configRef"],
+				"status": "NOT_RUNNING"
+			}
+
+	def stop_instance(self, name):
+		with self.__lock:
+			self.servers[name]["status"] = "NOT_RUNNING"
+
+	def delete_instance(self, name):
+		with self.__lock:
+			if self.servers[name]["status"] == "RUNNING":
+				raise ValueError("Instance {} is running".format(name))
+			del self.servers[name]
+
+	def delete_node(self, name):
+		with self.__lock:
+			if any(
+				server["nodeRef"] == name
+				for server in self.servers.values()
+			):
+				raise ValueError("Node {} has instances".format(name))
+			del self.nodes[name]
+
+	def cluster_servers(self, cluster_name):
+		with self.__lock:
+			config_ref = self.clusters[cluster_name]["configRef"]
+			return [
+				server for server in self.servers.values()
+				if server["configRef"] == config_ref
+			]
+
+	def start_cluster(self, cluster_name):
+		with self.__lock:
+			for server in self.cluster_servers(cluster_name):
+				server["status"] = "RUNNING"
+
+	def deploy(self, name, target, properties, context_root=None,
+			enabled=True):
+		with self.__lock:
+			self.applications[name] = {
+				"refs": {
+					target: False
+				},
+				"properties": properties,
+				"context_root": context_root or "/{}".format(name)
+			}
+			if enabled:
+				self.enable(name, target)
+
+	def enable(self, name, target):
+		with self.__lock:
+			app = self.applications[name]
+			base = name.split(":", 1)[0]
+			for other_name, other in self.applications.items():
+				if other_name.split(":", 1)[0] == base:
+					if target in other["refs"]:
+						other["refs"][target] = False
+			app["refs"][target] = True
+
+	def undeploy(self, name, target):
+		with self.__lock:
+			app = self.applications[name]
+			targets = [ target ]
+			if target in self.clusters:
+				targets.extend(
+					server["name"]
+					for server in self.cluster_servers(target)
+				)
+			for ref in targets:
+				app["refs"].pop(ref, None)
+			if len(app["refs"]) == 0:
+				del self.applications[name]
+
+	def enabled(self, name, target):
+		with self.__lock:
+			app = self.applications[name]
+			if target in app["refs"]:
+				return app["refs"][target]
+			cluster_name = next((
+				cluster_name
+				for cluster_name, cluster in self.clusters.items()
+				if cluster["configRef"] == self.servers[target]["configRef"]
+			), None)
+			return app["refs"].get(cluster_name, False)
+
+	def serves(self, host, path):
+		with self.__lock:
+			for server in self.servers.values():
+				node = self.nodes.get(server["nodeRef"])
+				if node is None or node["nodeHost"] != host \
+						or server["status"] != "RUNNING":
+					continue
+				for name, app in self.applications.items():
+					context_root = app["context_root"].rstrip("/")
+					if (path + "/").startswith(context_root + "/") \
+							and self.enabled(name, server["name"]):
+						return True
+			return False
@@ -0,0 +1,117 @@
+import contextlib
+import io
+
+import configurator
+import updater.local
+
+from benchmark import Environment
+
+def __config(env, instance_count):
+	return {
+		"management-public-key": env.public_key_path,
+		"management-private-key": env.private_key_path,
+		"docker-config-environment": "no",
+		"docker-endpoint": "unix:///var/run/docker.sock",
+		"docker-tls-enabled": "no",
+		"glassfish-image-version": "latest",
+		"glassfish-build-context": env.build_context,
+		"glassfish-container-prefix": "pto-bench",
+		"glassfish-ssh-port": str(env.ssh.port),
+		"glassfish-health-check": "yes",
+		"glassfish-ready-deadline": "10",
+		"glassfish-cluster-name": "cluster-01",
+		"glassfish-debug-enabled": "yes",
+		"glassfish-golden-images": "yes",
+		"glassfish-warm-pool-size": "0",
+		"glassfish-warm-pool-idle-timeout": "600",
+		"glassfish-instance-count": str(instance_count),
+		"glassfish-rolling-batch-size": "0",
+		"glassfish-serving-floor": "0",
+		"domain-name": "bench",
+		"domain-master-password": "masterpassword",
+		"pto-version": "LATEST",
+		"domain-admin-name": "admin",
+		"domain-admin-password": "adminadmin"
+	}
+
+def __run(env, instance_count, plan_only):
+	out = io.StringIO()
+	with contextlib.redirect_stdout(out):
+		with updater.local.Updater(
+			configurator.Configurator(
+				__config(env, instance_count),
+				unattended=True
+			),
+			env.docker_client
+		) as local:
+			if plan_only:
+				local.plan()
+			else:
+				local.update()
+	return out.getvalue().splitlines()
+
+def __expect(lines, expected):
+	missing = [ line for line in expected if line not in lines ]
+	if len(missing) > 0:
+		raise AssertionError("Missing output {}".format(", ".join(missing)))
+
+def check(instance_counts=(3, 1, 2)):
+	report = []
+	with Environment() as env:
+		env.install_artifact(
+			"net.preparatusopos.member",
+			"pto-ma-web",
+			"0.1.0-SNAPSHOT",
+			"war"
+		)
+		current = 0
+		for instance_count in instance_counts:
+			wanted = [
+				"inst-{:02d}".format(i)
+				for i in range(1, instance_count + 1)
+			]
+			changes = [
+				"+ instance inst-{0:02d} on node-{0:02d} in cluster-01".format(i)
+				for i in range(current + 1, instance_count + 1)
+			] + [
+				"- instance inst-{:02d} in cluster-01".format(i)
+				for i in range(instance_count + 1, current + 1)
+			] + [
+				"- node node-{:02d}".format(i)
+				for i in range(instance_count + 1, current + 1)
+			]
+			plan = __run(env, instance_count, True)
+			__expect(plan, changes)
+			__expect(__run(env, instance_count, False), changes)
+			with env.domain.lock:
+				running = sorted(
+					name
+					for name, server in env.domain.servers.items()
+					if name != "server" and server["status"] == "RUNNING"
+				)
+				nodes = sorted(env.domain.nodes)
+			if running != wanted:
+				raise AssertionError("Expected instances {}, found {}".format(
+					", ".join(wanted),
+					", ".join(running)
+				))
+			if len(nodes) != instance_count:
+				raise AssertionError("Expected {} node(s), found {}".format(
+					instance_count,
+					", ".join(nodes)
+				))
+			report.append("{} -> {} instance(s): {} planned change(s)".format(
+				current,
+				instance_count,
+				len([ line for line in plan if line[:2] in ("+ ", "- ", "~ ") ])
+			))
+			current = instance_count
+		counts = env.counters.snapshot()
+		if counts["docker.build"] != 2:
+			raise AssertionError("Expected 2 image builds, found {}".format(
+				counts["docker.build"]
+			))
+		if counts["docker.commit"] != 1:
+			raise AssertionError("Expected 1 golden image commit, found {}"
+				.format(counts["docker.commit"]))
+	return "\n".join(report)
@@ -0,0 +1,295 @@
+import datetime
+import email.parser
+import http.server
+import json
+import os
+import ssl
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+def self_signed_certificate(directory):
+	key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+	name = x509.Name([ x509.NameAttribute(NameOID.COMMON_NAME, "localhost") ])
+	now = datetime.datetime.now(datetime.timezone.utc)
+	cert = x509.CertificateBuilder().subject_name(
+		name
+	).issuer_name(
+		name
+	).public_key(
+		key.public_key()
+	).serial_number(
+		x509.random_serial_number()
+	).not_valid_before(
+		now
+	).not_valid_after(
+		now + datetime.timedelta(days=1)
+	).sign(key, hashes.SHA256())
+	cert_path = os.path.join(directory, "cert.pem")
+	key_path = os.path.join(directory, "key.pem")
+	with open(cert_path, "wb") as f:
+		f.write(cert.public_bytes(serialization.Encoding.PEM))
+	with open(key_path, "wb") as f:
+		f.write(key.private_bytes(
+			serialization.Encoding.PEM,
+			serialization.PrivateFormat.TraditionalOpenSSL,
+			serialization.NoEncryption()
+		))
+	return cert_path, key_path
+
+class NotFound(Exception):
+	pass
+
+class RestHandler(http.server.BaseHTTPRequestHandler):
+
+	protocol_version = "HTTP/1.1"
+	disable_nagle_algorithm = True
+
+	def setup(self):
+		super().setup()
+		self.server.domain.counters.add("rest.connection")
+
+	def log_message(self, format, *args):
+		pass
+
+	def __base(self):
+		return "https://{}:{}/management/domain".format(
+			*self.server.server_address
+		)
+
+	def __children(self, path, names):
+		return {
+			"childResources": {
+				name: "{}{}/{}".format(self.__base(), path, name)
+				for name in names
+			}
+		}
+
+	def __reply(self, status, extra_properties=None, exit_code="SUCCESS"):
+		body = json.dumps({
+			"message": "",
+			"exit_code": exit_code,
+			"extraProperties": extra_properties or {}
+		}).encode("UTF-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def __route(self, method):
+		self.server.domain.counters.add("rest.{}".format(method))
+		time.sleep(self.server.latency)
+		url = urllib.parse.urlsplit(self.path)
+		path = url.path[len("/management/domain"):]
+		parts = [ part for part in path.split("/") if len(part) > 0 ]
+		query = dict(urllib.parse.parse_qsl(url.query))
+		data = self.__form() if method == "POST" else {}
+		try:
+			with self.server.domain.lock:
+				extra_properties = getattr(
+					self,
+					"_RestHandler__{}".format(method.lower())
+				)(path, parts, query, data)
+			self.__reply(200, extra_properties)
+		except (NotFound, KeyError):
+			self.__reply(404, exit_code="FAILURE")
+		except ValueError:
+			self.__reply(400, exit_code="FAILURE")
+
+	def __form(self):
+		length = int(self.headers.get("Content-Length", 0))
+		body = self.rfile.read(length)
+		content_type = self.headers.get("Content-Type", "")
+		if content_type.startswith("multipart/form-data"):
+			message = email.parser.BytesParser().parsebytes(
+				"Content-Type: {}\r\n\r\n".format(content_type).encode(
+					"UTF-8"
+				) + body
+			)
+			form = {}
+			for part in message.get_payload():
+				name = part.get_param("name", header="content-disposition")
+				payload = part.get_payload(decode=True)
+				if part.get_filename() is None:
+					form[name] = payload.decode("UTF-8")
+				else:
+					form[name] = len(payload)
+			return form
+		return dict(urllib.parse.parse_qsl(body.decode("UTF-8")))
+
+	def __get(self, path, parts, query, data):
+		domain = self.server.domain
+		if parts == [ "nodes", "node" ]:
+			return self.__children(path, domain.nodes)
+		if parts[:2] == [ "nodes", "node" ] and len(parts) == 3:
+			return { "entity": domain.nodes[parts[2]] }
+		if parts[:2] == [ "nodes", "node" ] and parts[3:] == [ "ping-node-ssh" ]:
+			domain.nodes[parts[2]]
+			return {}
+		if parts == [ "clusters", "cluster" ]:
+			return self.__children(path, domain.clusters)
+		if parts[:2] == [ "clusters", "cluster" ] and len(parts) == 3:
+			return { "entity": domain.clusters[parts[2]] }
+		if parts[:2] == [ "clusters", "cluster" ] \
+				and parts[3:] == [ "application-ref" ]:
+			return self.__children(path, [
+				name
+				for name, app in domain.applications.items()
+				if parts[2] in app["refs"]
+			])
+		if parts[:2] == [ "clusters", "cluster" ] \
+				and parts[3:4] == [ "application-ref" ] and len(parts) == 5:
+			return { "entity": {
+				"ref": parts[4],
+				"enabled": "true" if domain.applications[parts[4]]["refs"][
+					parts[2]
+				] else "false"
+			} }
+		if parts == [ "servers", "server" ]:
+			return self.__children(path, domain.servers)
+		if parts[:2] == [ "servers", "server" ] and len(parts) == 3:
+			return { "entity": domain.servers[parts[2]] }
+		if parts[:2] == [ "servers", "server" ] \
+				and parts[3:] == [ "system-properties" ]:
+			domain.servers[parts[2]]
+			return { "systemProperties": [ {
+				"name": "HTTP_LISTENER_PORT",
+				"value": str(domain.http_port)
+			} ] }
+		if parts[:2] == [ "configs", "config" ] and len(parts) == 4:
+			return { "entity": dict(domain.configs[parts[2]][parts[3]]) }
+		if parts == [ "list-instances" ]:
+			return { "instanceList": [
+				{ "name": server["name"], "status": server["status"] }
+				for server in domain.cluster_servers(query["id"])
+			] }
+		if parts[:2] == [ "applications", "application" ] \
+				and parts[3:] == [ "property" ]:
+			properties = domain.applications[parts[2]]["properties"]
+			return { "properties": [
+				{ "name": name, "value": value }
+				for name, value in properties.items()
+			] }
+		raise NotFound(path)
+
+	def __post(self, path, parts, query, data):
+		domain = self.server.domain
+		if parts == [ "clusters", "create-cluster" ]:
+			domain.create_cluster(data["id"])
+			return {}
+		if parts[:2] == [ "configs", "config" ] and len(parts) == 4:
+			domain.configs[parts[2]][parts[3]].update(data)
+			return {}
+		if parts == [ "create-instance" ]:
+			domain.create_instance(
+				data["id"],
+				data["nodeagent"],
+				data["cluster"]
+			)
+			return {}
+		if parts[:2] == [ "clusters", "cluster" ] \
+				and parts[3:] == [ "start-cluster" ]:
+			domain.start_cluster(parts[2])
+			return {}
+		if parts[:2] == [ "servers", "server" ] \
+				and parts[3:] == [ "stop-instance" ]:
+			domain.stop_instance(parts[2])
+			return {}
+		if parts == [ "applications", "application" ]:
+			domain.counters.add("rest.upload.bytes", data["id"])
+			domain.deploy(
+				data["name"],
+				data["target"],
+				dict(
+					prop.split("=", 1)
+					for prop in data.get("properties", "").split(":")
+					if "=" in prop
+				),
+				data.get("contextroot"),
+				data.get("enabled", "true") == "true"
+			)
+			return {}
+		if parts[:2] == [ "applications", "application" ] \
+				and parts[3:] == [ "enable" ]:
+			domain.enable(parts[2], data["target"])
+			return {}
+		raise NotFound(path)
+
+	def __delete(self, path, parts, query, data):
+		domain = self.server.domain
+		if parts[:2] == [ "servers", "server" ] \
+				and parts[3:] == [ "delete-instance" ]:
+			domain.delete_instance(parts[2])
+			return {}
+		if parts[:2] == [ "applications", "application" ] and len(parts) == 3:
+			domain.undeploy(parts[2], query["target"])
+			return {}
+		raise NotFound(path)
+
+	def do_GET(self):
+		self.__route("GET")
+
+	def do_POST(self):
+		self.__route("POST")
+
+	def do_DELETE(self):
+		self.__route("DELETE")
+
+class FakeRestServer(http.server.ThreadingHTTPServer):
+
+	daemon_threads = True
+
+	def __init__(self, domain, latency=0.0):
+		super().__init__(("127.0.0.1", 0), RestHandler)
+		self.domain = domain
+		self.latency = latency
+		self.__cert_dir = tempfile.TemporaryDirectory()
+		context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+		context.load_cert_chain(*self_signed_certificate(
+			self.__cert_dir.name
+		))
+		self.socket = context.wrap_socket(self.socket, server_side=True)
+		threading.Thread(target=self.serve_forever, daemon=True).start()
+
+	def close(self):
+		self.shutdown()
+		self.server_close()
+		self.__cert_dir.cleanup()
+
+class InstanceHandler(http.server.BaseHTTPRequestHandler):
+
+	protocol_version = "HTTP/1.1"
+	disable_nagle_algorithm = True
+
+	def log_message(self, format, *args):
+		pass
+
+	def do_GET(self):
+		domain = self.server.domain
+		domain.counters.add("http.get")
+		host = self.connection.getsockname()[0]
+		path = urllib.parse.urlsplit(self.path).path
+		self.send_response(200 if domain.serves(host, path) else 404)
+		self.send_header("Content-Length", "0")
+		self.end_headers()
+
+class FakeInstanceServer(http.server.ThreadingHTTPServer):
+
+	daemon_threads = True
+
+	def __init__(self, domain):
+		super().__init__(("0.0.0.0", 0), InstanceHandler)
+		self.domain = domain
+		domain.http_port = self.server_address[1]
+		threading.Thread(target=self.serve_forever, daemon=True).start()
+
+	def close(self):
+		self.shutdown()
+		self.server_close()
@@ -0,0 +1,380 @@
+import logging
+import os
+import paramiko
+import shlex
+import socket
+import threading
+import time
+
+logging.getLogger("benchmark.ssh").addHandler(logging.NullHandler())
+logging.getLogger("benchmark.ssh").propagate = False
+
+class CommandFailed(Exception):
+	pass
+
+class FakeFileSystem:
+
+	def __init__(self):
+		self.__lock = threading.Lock()
+		self.__files = {}
+
+	def read(self, path):
+		with self.__lock:
+			return self.__files[path]
+
+	def write(self, path, offset, data):
+		with self.__lock:
+			content = self.__files.get(path, b"")
+			content = content[:offset].ljust(offset, b"\0") + data \
+				+ content[offset + len(data):]
+			self.__files[path] = content
+
+	def create(self, path, exclusive):
+		with self.__lock:
+			if exclusive and path in self.__files:
+				return False
+			self.__files.setdefault(path, b"")
+			return True
+
+	def truncate(self, path):
+		with self.__lock:
+			self.__files[path] = b""
+
+	def remove(self, path):
+		with self.__lock:
+			return self.__files.pop(path, None) is not None
+
+	def exists(self, path):
+		with self.__lock:
+			return path in self.__files
+
+class FakeSFTPHandle(paramiko.SFTPHandle):
+
+	def __init__(self, fs, path, flags):
+		super().__init__(flags)
+		self.__fs = fs
+		self.__path = path
+
+	def read(self, offset, length):
+		return self.__fs.read(self.__path)[offset:offset + length]
+
+	def write(self, offset, data):
+		self.__fs.write(self.__path, offset, data)
+		return paramiko.SFTP_OK
+
+	def stat(self):
+		attr = paramiko.SFTPAttributes()
+		attr.st_size = len(self.__fs.read(self.__path))
+		attr.st_mode = 0o100600
+		return attr
+
+	def chattr(self, attr):
+		return paramiko.SFTP_OK
+
+class FakeSFTPServer(paramiko.SFTPServerInterface):
+
+	def __init__(self, server, *args, **kwargs):
+		super().__init__(server, *args, **kwargs)
+		self.__server = server
+
+	def __path(self, path):
+		return self.canonicalize(path)
+
+	def canonicalize(self, path):
+		if not path.startswith("/"):
+			path = "/home/glassfish/{}".format(path)
+		return os.path.normpath(path)
+
+	def open(self, path, flags, attr):
+		self.__server.counters.add("sftp.open")
+		fs = self.__server.fs
+		path = self.__path(path)
+		if flags & os.O_CREAT:
+			if not fs.create(path, flags & os.O_EXCL):
+				return paramiko.SFTP_FAILURE
+			if flags & os.O_TRUNC:
+				fs.truncate(path)
+		elif not fs.exists(path):
+			return paramiko.SFTP_NO_SUCH_FILE
+		return FakeSFTPHandle(fs, path, flags)
+
+	def remove(self, path):
+		self.__server.counters.add("sftp.remove")
+		if self.__server.fs.remove(self.__path(path)):
+			return paramiko.SFTP_OK
+		return paramiko.SFTP_NO_SUCH_FILE
+
+	def stat(self, path):
+		path = self.__path(path)
+		if not self.__server.fs.exists(path):
+			return paramiko.SFTP_NO_SUCH_FILE
+		attr = paramiko.SFTPAttributes()
+		attr.st_size = len(self.__server.fs.read(path))
+		attr.st_mode = 0o100600
+		return attr
+
+	lstat = stat
+
+	def mkdir(self, path, attr):
+		return paramiko.SFTP_OK
+
+class FakeAsAdmin:
+
+	def __init__(self, domain, rest_address, jvm_startup):
+		self.__domain = domain
+		self.__rest_address = rest_address
+		self.__jvm_startup = jvm_startup
+
+	def __options(self, args):
+		options = {}
+		rest = []
+		it = iter(args)
+		for arg in it:
+			if arg in ("--terse", "--long"):
+				options[arg] = "true"
+			elif arg.startswith("--"):
+				options[arg] = next(it)
+			else:
+				rest.append(arg)
+		return options, rest
+
+	def __list_domains(self, options, params):
+		domain = self.__domain
+		if domain.name is None:
+			return []
+		return [ "{} {} {} {} false".format(
+			domain.name,
+			domain.admin_host,
+			domain.admin_port,
+			"true" if domain.running else "false"
+		) ]
+
+	def __create_domain(self, options, params, fs):
+		self.__domain.create(params[0], *self.__rest_address)
+		fs.create(
+			"/var/glassfish/domains/{}/config/master-password".format(params[0]),
+			False
+		)
+		fs.write(
+			"/var/glassfish/domains/{}/config/master-password".format(params[0]),
+			0,
+			os.urandom(64)
+		)
+		return []
+
+	def __start_domain(self, options, params):
+		if self.__domain.running:
+			raise CommandFailed(
+				"There is a process already using the admin port 4848 -- it "
+				"probably is another instance of a GlassFish server."
+			)
+		self.__domain.running = True
+		return []
+
+	def __restart_domain(self, options, params):
+		self.__domain.running = True
+		return []
+
+	def __stop_domain(self, options, params):
+		self.__domain.running = False
+		return []
+
+	def __list_nodes_ssh(self, options, params):
+		with self.__domain.lock:
+			return [ "Node Name   Node Type   Node Host" ] + [
+				"{} SSH {}".format(name, node["nodeHost"])
+				for name, node in self.__domain.nodes.items()
+			]
+
+	def __create_node_ssh(self, options, params):
+		self.__domain.create_node(params[0], options["--nodehost"])
+		return []
+
+	def __delete_node_ssh(self, options, params):
+		self.__domain.delete_node(params[0])
+		return []
+
+	def __start_cluster(self, options, params):
+		self.__domain.start_cluster(params[0])
+		return []
+
+	def __ignore(self, options, params):
+		return []
+
+	def subcommand(self, cmd, args, fs):
+		self.__domain.counters.add("asadmin.{}".format(cmd))
+		options, params = self.__options(args)
+		handler = {
+			"list-domains": self.__list_domains,
+			"create-domain": lambda options, params:
+				self.__create_domain(options, params, fs),
+			"start-domain": self.__start_domain,
+			"stop-domain": self.__stop_domain,
+			"restart-domain": self.__restart_domain,
+			"list-nodes-ssh": self.__list_nodes_ssh,
+			"create-node-ssh": self.__create_node_ssh,
+			"delete-node-ssh": self.__delete_node_ssh,
+			"start-cluster": self.__start_cluster,
+			"enable-secure-admin": self.__ignore,
+			"set": self.__ignore,
+			"export": self.__ignore,
+			"unset": self.__ignore
+		}.get(cmd)
+		if handler is None:
+			return None
+		return handler(options, params)
+
+	def launch(self, args, stdin, fs):
+		self.__domain.counters.add("asadmin.jvm")
+		time.sleep(self.__jvm_startup)
+		options, rest = self.__options(args)
+		if rest[0] != "multimode":
+			try:
+				lines = self.subcommand(rest[0], rest[1:], fs)
+			except CommandFailed as e:
+				return 1, [ " ".join([ "asadmin" ] + args) ], [ str(e) ]
+			if lines is None:
+				return 1, [], [ "Unknown command {}".format(rest[0]) ]
+			return 0, [ " ".join([ "asadmin" ] + args) ] + lines, []
+		out = []
+		for line in stdin.decode("UTF-8").splitlines():
+			tokens = shlex.split(line)
+			if len(tokens) == 0:
+				continue
+			try:
+				lines = self.subcommand(tokens[0], tokens[1:], fs)
+			except CommandFailed as e:
+				out.append(str(e))
+				lines = None
+			if lines is None:
+				out.append("Command {} failed.".format(tokens[0]))
+			else:
+				out.extend(lines)
+				out.append("Command {} executed successfully.".format(
+					tokens[0]
+				))
+		return 0, out, []
+
+class FakeSSHServer(paramiko.ServerInterface):
+
+	def __init__(self, host_server, fs):
+		self.__host_server = host_server
+		self.counters = host_server.counters
+		self.fs = fs
+
+	def get_allowed_auths(self, username):
+		return "publickey"
+
+	def check_auth_publickey(self, username, key):
+		return paramiko.AUTH_SUCCESSFUL
+
+	def check_channel_request(self, kind, chanid):
+		if kind == "session":
+			return paramiko.OPEN_SUCCEEDED
+		return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+	def check_channel_exec_request(self, channel, command):
+		threading.Thread(
+			target=self.__host_server.execute,
+			args=(channel, command.decode("UTF-8")),
+			daemon=True
+		).start()
+		return True
+
+class FakeSSHHost:
+
+	def __init__(self, domain, rest_address, jvm_startup=0.0):
+		self.counters = domain.counters
+		self.__asadmin = FakeAsAdmin(domain, rest_address, jvm_startup)
+		self.__host_key = paramiko.RSAKey.generate(2048)
+		self.__file_systems = {}
+		self.__lock = threading.Lock()
+		self.__socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.__socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.__socket.bind(("0.0.0.0", 0))
+		self.__socket.listen(128)
+		self.__transports = []
+		self.__closed = False
+		threading.Thread(target=self.__serve, daemon=True).start()
+
+	@property
+	def port(self):
+		return self.__socket.getsockname()[1]
+
+	def file_system(self, address):
+		with self.__lock:
+			return self.__file_systems.setdefault(address, FakeFileSystem())
+
+	def __serve(self):
+		while not self.__closed:
+			try:
+				sock, peer = self.__socket.accept()
+			except OSError:
+				return
+			threading.Thread(
+				target=self.__handle,
+				args=(sock,),
+				daemon=True
+			).start()
+
+	def __handle(self, sock):
+		if not sock.getsockname()[0].startswith("127."):
+			sock.close()
+			return
+		self.counters.add("ssh.accept")
+		transport = paramiko.Transport(sock)
+		transport.set_log_channel("benchmark.ssh")
+		transport.add_server_key(self.__host_key)
+		transport.set_subsystem_handler(
+			"sftp",
+			paramiko.SFTPServer,
+			FakeSFTPServer
+		)
+		server = FakeSSHServer(
+			self,
+			self.file_system(sock.getsockname()[0])
+		)
+		try:
+			transport.start_server(server=server)
+		except (EOFError, OSError, paramiko.SSHException):
+			return
+		with self.__lock:
+			self.__transports.append(transport)
+		channels = []
+		while transport.is_active():
+			channel = transport.accept(1.0)
+			channels = [ chan for chan in channels if not chan.closed ]
+			if channel is not None:
+				channels.append(channel)
+
+	def execute(self, channel, command):
+		self.counters.add("ssh.exec")
+		tokens = shlex.split(command.replace("$HOME", "/home/glassfish"))
+		stdin = b""
+		if tokens[0].endswith("/bin/asadmin") and "multimode" in tokens:
+			data = channel.recv(32768)
+			while len(data) > 0:
+				stdin += data
+				data = channel.recv(32768)
+		if tokens[0].endswith("/bin/asadmin"):
+			exit_status, out, err = self.__asadmin.launch(
+				tokens[1:],
+				stdin,
+				channel.get_transport().server_object.fs
+			)
+		else:
+			exit_status, out, err = 0, [], []
+		if len(out) > 0:
+			channel.sendall("".join("{}\n".format(line) for line in out))
+		if len(err) > 0:
+			channel.sendall_stderr("".join("{}\n".format(line) for line in err))
+		channel.send_exit_status(exit_status)
+		channel.shutdown_write()
+
+	def close(self):
+		self.__closed = True
+		self.__socket.close()
+		with self.__lock:
+			transports = list(self.__transports)
+		for transport in transports:
+			transport.close()
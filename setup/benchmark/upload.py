@@ -0,0 +1,135 @@
+import http.server
+import os
+import re
+import requests
+import resource
+import tempfile
+import threading
+
+from tools.http import multipart
+
+class UploadHandler(http.server.BaseHTTPRequestHandler):
+
+	protocol_version = "HTTP/1.1"
+
+	def log_message(self, format, *args):
+		pass
+
+	def do_POST(self):
+		remaining = int(self.headers["Content-Length"])
+		received = 0
+		while remaining > 0:
+			chunk = self.rfile.read(min(remaining, 1 << 16))
+			if len(chunk) == 0:
+				break
+			received += len(chunk)
+			remaining -= len(chunk)
+		self.server.received = received
+		self.send_response(200)
+		self.send_header("Content-Length", "0")
+		self.end_headers()
+
+class FakeUploadServer(http.server.ThreadingHTTPServer):
+
+	daemon_threads = True
+
+	def __init__(self):
+		super().__init__(("127.0.0.1", 0), UploadHandler)
+		self.received = None
+		threading.Thread(target=self.serve_forever, daemon=True).start()
+
+	def close(self):
+		self.shutdown()
+		self.server_close()
+
+def __peak_rss():
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss << 10
+
+def __check_encoding(chunk_size=1 << 10):
+	content = os.urandom(5 * chunk_size + 7)
+	with tempfile.TemporaryFile() as f:
+		f.write(content)
+		f.seek(0)
+		encoder = multipart.MultipartEncoder(
+			fields={
+				"name": "upload"
+			},
+			files={
+				"id": ("upload.war", f, "application/octet-stream")
+			},
+			chunk_size=chunk_size
+		)
+		chunks = list(encoder)
+	body = b"".join(chunks)
+	if len(body) != len(encoder) or encoder.sent != len(encoder):
+		raise AssertionError("Encoded {} bytes, sent {}, expected {}".format(
+			len(body),
+			encoder.sent,
+			len(encoder)
+		))
+	if max(len(chunk) for chunk in chunks) > chunk_size:
+		raise AssertionError("Encoder produced chunks over {} bytes".format(
+			chunk_size
+		))
+	boundary = encoder.content_type.split("boundary=", 1)[1].encode("UTF-8")
+	sections = body.split(b"--" + boundary)
+	if sections[0] != b"" or sections[-1] != b"--\r\n":
+		raise AssertionError("Malformed multipart body")
+	parts = {}
+	for section in sections[1:-1]:
+		headers, payload = section[2:-2].split(b"\r\n\r\n", 1)
+		name = re.search(rb'name="([^"]*)"', headers).group(1)
+		parts[name.decode("UTF-8")] = payload
+	if parts != { "name": b"upload", "id": content }:
+		raise AssertionError("Multipart body does not carry the fields")
+
+def check(size=256 << 20, rss_limit=64 << 20):
+	__check_encoding()
+	block = os.urandom(1 << 20)
+	with tempfile.TemporaryFile() as f:
+		for i in range(size >> 20):
+			f.write(block)
+		f.write(block[:size & ((1 << 20) - 1)])
+		f.seek(0)
+		server = FakeUploadServer()
+		try:
+			encoder = multipart.MultipartEncoder(
+				fields={
+					"name": "upload"
+				},
+				files={
+					"id": ("upload.war", f, "application/octet-stream")
+				}
+			)
+			baseline = __peak_rss()
+			resp = requests.post(
+				"http://{}:{}/".format(*server.server_address),
+				data=encoder,
+				headers={
+					"Content-Type": encoder.content_type
+				}
+			)
+			growth = __peak_rss() - baseline
+		finally:
+			server.close()
+		resp.raise_for_status()
+		if server.received != len(encoder):
+			raise AssertionError("Server received {} of {} bytes".format(
+				server.received,
+				len(encoder)
+			))
+		if len(encoder) <= size:
+			raise AssertionError("Multipart body of {} bytes is shorter than "
+				"the {} byte file".format(len(encoder), size))
+		if growth > rss_limit:
+			raise AssertionError("Peak RSS grew {} MiB uploading {} MiB".format(
+				growth >> 20,
+				size >> 20
+			))
+	return "Uploaded {} MiB in {:.2f}s ({:.1f} MiB/s), peak RSS grew {} MiB" \
+		.format(
+			size >> 20,
+			encoder.elapsed,
+			encoder.throughput / (1 << 20),
+			growth >> 20
+		)
@@ -14,7 +14,7 @@ class Configurator:
 	def get(self, name, title, ex_values=None, def_value=None, secret=False):
 		if not name in self.__config:
 			if self.__unattended:
-				raise UnknownProperpertyError(name)
+				raise UnknownPropertyError(name)
 			value = self.__ask(title, ex_values, def_value, secret)
 			if len(value) <= 0:
 				value = def_value
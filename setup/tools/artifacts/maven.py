@@ -1,24 +1,355 @@
+import functools
+import hashlib
+import json
 import os
+import re
+import threading
+import xml.etree.ElementTree
 
 class LocalArtifact:
 
-	def __init__(self, path):
+	def __init__(self, path, index=None):
 		self.__path = path
-		
+		self.__index = index
+
+	@property
+	def path(self):
+		return self.__path
+
 	def open(self):
 		return open(self.__path, "rb")
-		
+
+	def __compute_digest(self):
+		sha1 = hashlib.sha1()
+		with self.open() as f:
+			for chunk in iter(lambda: f.read(1 << 20), b""):
+				sha1.update(chunk)
+		return sha1.hexdigest()
+
+	def digest(self):
+		if self.__index is None:
+			return self.__compute_digest()
+		return self.__index.lookup(
+			"sha1",
+			self.__path,
+			lambda path: self.__compute_digest()
+		)
+
+@functools.total_ordering
+class Version:
+
+	__QUALIFIERS = {
+		"alpha": 0,
+		"a": 0,
+		"beta": 1,
+		"b": 1,
+		"milestone": 2,
+		"m": 2,
+		"rc": 3,
+		"cr": 3,
+		"snapshot": 4,
+		"": 5,
+		"ga": 5,
+		"final": 5,
+		"release": 5,
+		"sp": 6
+	}
+	__RELEASE = (0, 5, "")
+
+	def __init__(self, value):
+		self.__value = value
+		self.__key = self.__parse(value)
+
+	def __item(self, token):
+		if token.isdigit():
+			return (1, int(token), "")
+		token = token.lower()
+		if token in self.__QUALIFIERS:
+			return (0, self.__QUALIFIERS[token], "")
+		return (0, len(self.__QUALIFIERS), token)
+
+	def __parse(self, value):
+		key = []
+		for segment in value.split("-"):
+			key.extend(
+				self.__item(token)
+				for token in re.findall(r"\d+|[^\d.]+", segment)
+			)
+			while len(key) > 0 and key[-1] in ((1, 0, ""), self.__RELEASE):
+				key.pop()
+		return tuple(key)
+
+	def __padded(self, other):
+		length = max(len(self.__key), len(other.__key))
+		return (
+			self.__key + (self.__RELEASE,) * (length - len(self.__key)),
+			other.__key + (self.__RELEASE,) * (length - len(other.__key))
+		)
+
+	@property
+	def snapshot(self):
+		return self.__value.endswith("-SNAPSHOT")
+
+	def __eq__(self, other):
+		mine, theirs = self.__padded(other)
+		return mine == theirs
+
+	def __lt__(self, other):
+		mine, theirs = self.__padded(other)
+		return mine < theirs
+
+	def __hash__(self):
+		return hash(self.__key)
+
+	def __str__(self):
+		return self.__value
+
+class VersionRange:
+
+	def __init__(self, spec):
+		self.__spec = spec
+		self.__intervals = []
+		for interval in re.findall(
+			r"[\[(][^\])]*[\])]",
+			spec.replace(" ", "")
+		):
+			bounds = interval[1:-1]
+			lower, upper = bounds.split(",", 1) if "," in bounds \
+				else (bounds, bounds)
+			self.__intervals.append((
+				Version(lower) if len(lower) > 0 else None,
+				interval.startswith("["),
+				Version(upper) if len(upper) > 0 else None,
+				interval.endswith("]")
+			))
+		if len(self.__intervals) == 0:
+			raise ValueError("Invalid version range {}".format(spec))
+
+	@staticmethod
+	def is_range(spec):
+		return spec.startswith("[") or spec.startswith("(")
+
+	def __contains__(self, version):
+		for lower, lower_inclusive, upper, upper_inclusive in self.__intervals:
+			if lower is not None and (
+				version < lower or version == lower and not lower_inclusive
+			):
+				continue
+			if upper is not None and (
+				version > upper or version == upper and not upper_inclusive
+			):
+				continue
+			return True
+		return False
+
+	def __str__(self):
+		return self.__spec
+
+class ArtifactIndex:
+
+	def __init__(self, path):
+		self.__path = path
+		self.__lock = threading.Lock()
+		self.__entries = None
+
+	def __load(self):
+		if self.__entries is None:
+			try:
+				with open(self.__path, "r") as f:
+					self.__entries = json.load(f)
+			except (FileNotFoundError, ValueError):
+				self.__entries = {}
+		return self.__entries
+
+	def __save(self):
+		os.makedirs(os.path.dirname(self.__path) or ".", exist_ok=True)
+		saving_path = "{}.{}".format(self.__path, os.getpid())
+		with open(saving_path, "w") as f:
+			json.dump(self.__entries, f)
+		os.replace(saving_path, self.__path)
+
+	def lookup(self, kind, path, load):
+		stat = os.stat(path)
+		with self.__lock:
+			entry = self.__load().get(kind, {}).get(path)
+		if entry is not None and entry["mtime"] == stat.st_mtime_ns \
+				and entry["size"] == stat.st_size:
+			return entry["value"]
+		value = load(path)
+		with self.__lock:
+			self.__load().setdefault(kind, {})[path] = {
+				"mtime": stat.st_mtime_ns,
+				"size": stat.st_size,
+				"value": value
+			}
+			self.__save()
+		return value
+
 class LocalRepository:
 
-	def __init__(self):
-		self.__base_path = os.path.expanduser("~/.m2/repository")
-		
-	def artifact(self, group_id, artifact_id, version, packaging="jar"):
+	__METADATA = "maven-metadata-local.xml"
+	__TIMESTAMPED = re.compile(r"^(.*)-(\d{8}\.\d{6})-(\d+)$")
+
+	def __init__(self, base_path=None, index_path=None):
+		self.__base_path = base_path or os.path.expanduser("~/.m2/repository")
+		self.__index = ArtifactIndex(
+			index_path or os.path.expanduser("~/.cache/pto/maven-index.json")
+		)
+
+	def __artifact_dir(self, group_id, artifact_id):
 		comps = []
 		comps.append(self.__base_path)
 		comps.extend(group_id.split("."))
 		comps.append(artifact_id)
-		comps.append(version)
-		comps.append("{}-{}.{}".format(artifact_id, version, packaging))
-		return LocalArtifact(os.path.join(*comps))
+		return os.path.join(*comps)
+
+	def __children(self, elem, name):
+		return [
+			child
+			for child in elem
+			if child.tag.rsplit("}", 1)[-1] == name
+		]
+
+	def __text(self, elem, *names):
+		for name in names:
+			found = self.__children(elem, name)
+			if len(found) == 0:
+				return None
+			elem = found[0]
+		return (elem.text or "").strip()
+
+	def __metadata_versions(self, path):
+		versioning = self.__children(
+			xml.etree.ElementTree.parse(path).getroot(),
+			"versioning"
+		)
+		return [
+			(version.text or "").strip()
+			for elem in versioning
+			for versions in self.__children(elem, "versions")
+			for version in self.__children(versions, "version")
+		]
+
+	def __listed_versions(self, path):
+		return [
+			name
+			for name in os.listdir(path)
+			if os.path.isdir(os.path.join(path, name))
+		]
+
+	def __snapshot_values(self, path):
+		values = {}
+		for versioning in self.__children(
+			xml.etree.ElementTree.parse(path).getroot(),
+			"versioning"
+		):
+			timestamp = self.__text(versioning, "snapshot", "timestamp")
+			build_number = self.__text(versioning, "snapshot", "buildNumber")
+			if timestamp and build_number:
+				values["*"] = "{}-{}".format(timestamp, build_number)
+			for snapshot_versions in self.__children(
+				versioning,
+				"snapshotVersions"
+			):
+				for snapshot_version in self.__children(
+					snapshot_versions,
+					"snapshotVersion"
+				):
+					values["{}:{}".format(
+						self.__text(snapshot_version, "extension") or "jar",
+						self.__text(snapshot_version, "classifier") or ""
+					)] = self.__text(snapshot_version, "value")
+		return values
+
+	def versions(self, group_id, artifact_id):
+		artifact_dir = self.__artifact_dir(group_id, artifact_id)
+		metadata_path = os.path.join(artifact_dir, self.__METADATA)
+		if os.path.exists(metadata_path):
+			versions = self.__index.lookup(
+				"versions",
+				metadata_path,
+				self.__metadata_versions
+			)
+		elif os.path.isdir(artifact_dir):
+			versions = self.__index.lookup(
+				"listing",
+				artifact_dir,
+				self.__listed_versions
+			)
+		else:
+			versions = []
+		return sorted(versions, key=Version)
+
+	def resolve(self, group_id, artifact_id, version):
+		if version not in ("LATEST", "RELEASE") \
+				and not VersionRange.is_range(version):
+			return version
+		candidates = [
+			Version(candidate)
+			for candidate in self.versions(group_id, artifact_id)
+		]
+		if version == "RELEASE":
+			candidates = [
+				candidate
+				for candidate in candidates
+				if not candidate.snapshot
+			]
+		elif version != "LATEST":
+			version_range = VersionRange(version)
+			candidates = [
+				candidate
+				for candidate in candidates
+				if candidate in version_range
+			]
+		if len(candidates) == 0:
+			raise LookupError("No version of {}:{} matches {}".format(
+				group_id,
+				artifact_id,
+				version
+			))
+		return str(max(candidates))
+
+	def __file_version(self, version_dir, version, packaging, classifier):
+		metadata_path = os.path.join(version_dir, self.__METADATA)
+		if not os.path.exists(metadata_path):
+			return version
+		values = self.__index.lookup(
+			"snapshots",
+			metadata_path,
+			self.__snapshot_values
+		)
+		value = values.get("{}:{}".format(packaging, classifier or ""))
+		if value is not None:
+			return value
+		if "*" in values:
+			return version.replace("SNAPSHOT", values["*"])
+		return version
 
+	def artifact(self, group_id, artifact_id, version, packaging="jar",
+			classifier=None):
+		version = self.resolve(group_id, artifact_id, version)
+		timestamped = self.__TIMESTAMPED.match(version)
+		base_version = "{}-SNAPSHOT".format(timestamped.group(1)) \
+			if timestamped is not None else version
+		version_dir = os.path.join(
+			self.__artifact_dir(group_id, artifact_id),
+			base_version
+		)
+		file_versions = [ version ]
+		if version.endswith("-SNAPSHOT"):
+			file_versions.insert(0, self.__file_version(
+				version_dir,
+				version,
+				packaging,
+				classifier
+			))
+		for file_version in file_versions:
+			path = os.path.join(version_dir, "{}-{}{}.{}".format(
+				artifact_id,
+				file_version,
+				"-{}".format(classifier) if classifier is not None else "",
+				packaging
+			))
+			if os.path.exists(path):
+				break
+		return LocalArtifact(path, self.__index)
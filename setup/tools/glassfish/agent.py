@@ -49,4 +49,4 @@ class Agent:
 			return self.__find_domain(name)
 
 	def close(self):
-		pass
+		self.__machines.close()
@@ -1,60 +1,362 @@
+import contextlib
+import hashlib
 import paramiko
 import re
+import select
 import sys
 import random
 import string
+import threading
 import time
 
 from tools.glassfish import domain
+from tools.glassfish import readiness
+from tools import tracing
+
+ALREADY_RUNNING = r"already using the admin port|is already running"
+
+class SSHClientPool:
+
+	def __init__(self, idle_timeout=300, max_idle=4,
+			ready_deadline=readiness.DEFAULT_DEADLINE, port=22):
+		self.__port = port
+		self.__idle_timeout = idle_timeout
+		self.__ready_deadline = ready_deadline
+		self.__max_idle = max_idle
+		self.__idle = {}
+		self.__lock = threading.Lock()
+		self.__closed = False
+
+	@property
+	def port(self):
+		return self.__port
+
+	def __healthy(self, ssh_client):
+		transport = ssh_client.get_transport()
+		if transport is None or not transport.is_active():
+			return False
+		try:
+			transport.send_ignore()
+			return True
+		except (EOFError, OSError, paramiko.SSHException):
+			return False
+
+	def __evict(self, now):
+		evicted = []
+		for key, entries in self.__idle.items():
+			alive = []
+			for ssh_client, last_used in entries:
+				if now - last_used > self.__idle_timeout:
+					evicted.append(ssh_client)
+				else:
+					alive.append((ssh_client, last_used))
+			self.__idle[key] = alive
+		return evicted
+
+	def __connect(self, host, private_key_path):
+		readiness.wait_ssh(host, self.__port, self.__ready_deadline)
+		ssh_client = paramiko.SSHClient()
+		ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+		with tracing.span("ssh.connect", host=host):
+			ssh_client.connect(
+				hostname=host,
+				port=self.__port,
+				username="glassfish",
+				allow_agent=False,
+				look_for_keys=False,
+				key_filename=private_key_path,
+				timeout=self.__ready_deadline
+			)
+		return ssh_client
+
+	def acquire(self, host, private_key_path):
+		key = (host, private_key_path)
+		with self.__lock:
+			if self.__closed:
+				raise ValueError("SSH client pool is closed")
+			discarded = self.__evict(time.monotonic())
+			ssh_client = None
+			entries = self.__idle.get(key, [])
+			while ssh_client is None and len(entries) > 0:
+				candidate, last_used = entries.pop()
+				if self.__healthy(candidate):
+					ssh_client = candidate
+				else:
+					discarded.append(candidate)
+		for candidate in discarded:
+			candidate.close()
+		if ssh_client is None:
+			ssh_client = self.__connect(host, private_key_path)
+		return ssh_client
+
+	def release(self, host, private_key_path, ssh_client):
+		key = (host, private_key_path)
+		with self.__lock:
+			entries = self.__idle.setdefault(key, [])
+			if self.__closed or len(entries) >= self.__max_idle:
+				ssh_client.close()
+			else:
+				entries.append((ssh_client, time.monotonic()))
+
+	def discard(self, ssh_client):
+		ssh_client.close()
+
+	def close(self):
+		with self.__lock:
+			self.__closed = True
+			idle = self.__idle
+			self.__idle = {}
+		for entries in idle.values():
+			for ssh_client, last_used in entries:
+				ssh_client.close()
+
+class AsAdminError(Exception):
+
+	def __init__(self, failed):
+		super().__init__("asadmin command{} {} failed".format(
+			"s" if len(failed) > 1 else "",
+			", ".join(result.command for result in failed)
+		))
+		self.failed = failed
+
+class CommandResult:
+
+	def __init__(self, command, exit_status, stdout, stderr, started,
+			finished):
+		self.__command = command
+		self.__exit_status = exit_status
+		self.__stdout = stdout
+		self.__stderr = stderr
+		self.__started = started
+		self.__finished = finished
+
+	@property
+	def command(self):
+		return self.__command
+
+	@property
+	def exit_status(self):
+		return self.__exit_status
+
+	@property
+	def succeeded(self):
+		return self.__exit_status == 0
+
+	@property
+	def stdout(self):
+		return self.__stdout
+
+	@property
+	def stderr(self):
+		return self.__stderr
+
+	@property
+	def duration(self):
+		return self.__finished - self.__started
+
+	def matches(self, pattern):
+		return pattern is not None and any(
+			re.search(pattern, line) is not None
+			for line in self.__stdout + self.__stderr
+		)
+
+class TransferError(Exception):
+
+	def __init__(self, transfer):
+		super().__init__("{}:{} checksum {} does not match {}".format(
+			transfer.host,
+			transfer.path,
+			transfer.remote_digest,
+			transfer.digest
+		))
+		self.transfer = transfer
+
+class FileTransfer:
+
+	def __init__(self, host, path, size, digest, remote_digest, started,
+			finished):
+		self.__host = host
+		self.__path = path
+		self.__size = size
+		self.__digest = digest
+		self.__remote_digest = remote_digest
+		self.__started = started
+		self.__finished = finished
+
+	@property
+	def host(self):
+		return self.__host
+
+	@property
+	def path(self):
+		return self.__path
+
+	@property
+	def size(self):
+		return self.__size
+
+	@property
+	def digest(self):
+		return self.__digest
+
+	@property
+	def remote_digest(self):
+		return self.__remote_digest
+
+	@property
+	def verified(self):
+		return self.__digest == self.__remote_digest
+
+	@property
+	def duration(self):
+		return self.__finished - self.__started
+
+	def __str__(self):
+		return "Copied {} bytes to {}:{} in {:.3f}s (sha256 {})".format(
+			self.__size,
+			self.__host,
+			self.__path,
+			self.duration,
+			self.__remote_digest[:12]
+		)
+
+class Batch:
+
+	def __init__(self):
+		self.__commands = []
+		self.__accepted = []
+		self.__results = None
+
+	@property
+	def commands(self):
+		return self.__commands
+
+	@property
+	def accepted(self):
+		return self.__accepted
+
+	@property
+	def results(self):
+		return self.__results
+
+	def add(self, cmd, params, host, port, user, passwords, accepted=None):
+		self.__commands.append((cmd, params, host, port, user, passwords))
+		self.__accepted.append(accepted)
+
+	def complete(self, results):
+		self.__results = results
 
 class AsAdmin:
 
-	def __init__(self, ssh_ip_address, ssh_private_key_path):
-		self.__ssh_client = paramiko.SSHClient()
-		self.__ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+	def __init__(self, ssh_ip_address, ssh_private_key_path, ssh_pool=None):
+		self.__ssh_pool = ssh_pool if ssh_pool is not None \
+			else SSHClientPool(max_idle=0)
+		self.__ssh_client = None
 		self.__ssh_ip_address = ssh_ip_address
 		self.__ssh_private_key_path = ssh_private_key_path
 		self.__domain_dir = "/var/glassfish/domains"
 		self.__node_dir = "/var/glassfish/nodes"
+		self.__passwords_dir = ".asadmin-passwords"
+		self.__passwords_dir_ready = False
+		self.__batch = None
+		self.__sftp_client = None
 
 	def __enter__(self):
-		# XXX Race condition: Waiting SSH server to be ready
-		for i in range(0, 5):
-			try:
-				self.__ssh_client.connect(
-					hostname=self.__ssh_ip_address,
-					username="glassfish",
-					allow_agent=False,
-					look_for_keys=False,
-					key_filename=self.__ssh_private_key_path
-				)
-				return self
-			except ConnectionRefusedError:
-				time.sleep(1)
-			except paramiko.ssh_exception.NoValidConnectionsError:
-				time.sleep(1)
-		raise LookupError("SSH server not available")
+		self.__ssh_client = self.__ssh_pool.acquire(
+			self.__ssh_ip_address,
+			self.__ssh_private_key_path
+		)
+		return self
 
 	def __exit__(self, type, value, tp):
-		self.__ssh_client.close()
+		if self.__sftp_client is not None:
+			self.__sftp_client.close()
+			self.__sftp_client = None
+		ssh_client = self.__ssh_client
+		self.__ssh_client = None
+		if isinstance(value, (EOFError, OSError, paramiko.SSHException)):
+			self.__ssh_pool.discard(ssh_client)
+		else:
+			self.__ssh_pool.release(
+				self.__ssh_ip_address,
+				self.__ssh_private_key_path,
+				ssh_client
+			)
+
+	def __sftp(self):
+		if self.__sftp_client is None:
+			self.__sftp_client = self.__ssh_client.open_sftp()
+		return self.__sftp_client
+
+	def __private_dir(self):
+		if not self.__passwords_dir_ready:
+			try:
+				self.__sftp().mkdir(self.__passwords_dir, 0o700)
+			except IOError:
+				self.__sftp().chmod(self.__passwords_dir, 0o700)
+			self.__passwords_dir_ready = True
+		return self.__passwords_dir
+
+	def __write_passwords(self, passwords):
+		passwords_file_path = "{}/passwords-{}.txt".format(
+			self.__private_dir(),
+			"".join(
+				random.choice(string.ascii_lowercase + string.digits)
+				for _ in range(8)
+			)
+		)
+		with self.__sftp().open(passwords_file_path, "wx") as f:
+			f.chmod(0o600)
+			f.write("".join(
+				"{}={}\n".format(name, value)
+				for name, value in passwords.items()
+			))
+		return passwords_file_path
+
+	def __remove_file(self, path):
+		try:
+			self.__sftp().remove(path)
+		except FileNotFoundError:
+			pass
+
+	def __drain(self, channel, timeout=1.0):
+		pending = {
+			"stdout": b"",
+			"stderr": b""
+		}
+		receivers = {
+			"stdout": (channel.recv_ready, channel.recv),
+			"stderr": (channel.recv_stderr_ready, channel.recv_stderr)
+		}
+		while True:
+			select.select([ channel ], [], [], timeout)
+			received = False
+			for stream, (ready, recv) in receivers.items():
+				if ready():
+					data = recv(32768)
+					received = received or len(data) > 0
+					pending[stream] += data
+					*lines, pending[stream] = pending[stream].split(b"\n")
+					for line in lines:
+						yield stream, line.decode("UTF-8", "replace").strip()
+			if not received and (
+				channel.exit_status_ready() or channel.eof_received
+			) and not channel.recv_ready() and not channel.recv_stderr_ready():
+				break
+		for stream, data in pending.items():
+			if len(data) > 0:
+				yield stream, data.decode("UTF-8", "replace").strip()
 
 	def __run(self, cmd, params=None, host=None, port=None, user=None,
-			passwords=None):
+			passwords=None, accepted=None):
+		if self.__batch is not None:
+			self.__batch.add(cmd, params, host, port, user, passwords, accepted)
+			return None
+		passwords_file_path = None
+		channel = None
 		try:
-			passwords_file_path = None
 			if passwords is not None:
-				passwords_file_path = "$HOME/passwords-{}.txt".format(
-					"".join(
-						random.choice(string.ascii_lowercase + string.digits)
-						for _ in range(8)
-					)
-				)
-				for name, value in passwords.items():
-					self.__ssh_client.exec_command("echo {}={} >> {}".format(
-						name,
-						value,
-						passwords_file_path
-					))
+				passwords_file_path = self.__write_passwords(passwords)
 
 			args = "$HOME/bin/asadmin --terse"
 			if host is not None:
@@ -72,54 +374,210 @@ class AsAdmin:
 			if params is not None:
 				for param in params:
 					args = "{} {}".format(args, param)
-			stdin, stdout, stderr = self.__ssh_client.exec_command(args)
 
-			print(stdout.readline().strip())
+			with tracing.span(
+				"asadmin.run",
+				host=self.__ssh_ip_address,
+				command=cmd
+			) as span:
+				started = time.monotonic()
+				channel = self.__ssh_client.get_transport().open_session()
+				channel.exec_command(args)
+				channel.shutdown_write()
+				output = {
+					"stdout": [],
+					"stderr": []
+				}
+				echoed = False
+				for stream, line in self.__drain(channel):
+					if stream == "stderr":
+						print(line)
+						output[stream].append(line)
+					elif not echoed:
+						print(line)
+						echoed = True
+					elif len(line) > 0:
+						output[stream].append(line)
+						yield line
+				result = CommandResult(
+					cmd,
+					channel.recv_exit_status(),
+					output["stdout"],
+					output["stderr"],
+					started,
+					time.monotonic()
+				)
+				span.set(exit_status=result.exit_status)
+			if not result.succeeded and not result.matches(accepted):
+				raise AsAdminError([ result ])
+			return result
+
+		finally:
+			if channel is not None:
+				channel.close()
+			if passwords_file_path is not None:
+				self.__remove_file(passwords_file_path)
+
+	def __call(self, cmd, params=None, host=None, port=None, user=None,
+			passwords=None, accepted=None):
+		run = self.__run(cmd, params, host, port, user, passwords, accepted)
+		while True:
+			try:
+				print(next(run))
+			except StopIteration as stop:
+				return stop.value
 
-			line = stderr.readline().strip()
-			while len(line) > 0:
-				print(line)
-				line = stderr.readline().strip()
+	def __multimode_script(self, batch, passwords_file_paths):
+		script = []
+		for (cmd, params, host, port, user, passwords), passwords_file_path \
+				in zip(batch.commands, passwords_file_paths):
+			options = {
+				"AS_ADMIN_HOST": host,
+				"AS_ADMIN_PORT": port,
+				"AS_ADMIN_USER": user,
+				"AS_ADMIN_PASSWORDFILE": passwords_file_path
+			}
+			exported = [
+				"{}={}".format(name, value)
+				for name, value in options.items()
+				if value is not None
+			]
+			unset = [
+				name
+				for name, value in options.items()
+				if value is None
+			]
+			if len(exported) > 0:
+				script.append("export {}".format(" ".join(exported)))
+			if len(unset) > 0:
+				script.append("unset {}".format(" ".join(unset)))
+			script.append(" ".join([ cmd ] + list(params or ())))
+		return "".join("{}\n".format(line) for line in script)
 
-			line = stdout.readline().strip()
-			while len(line) > 0:
-				yield line
-				line = stdout.readline().strip()
+	def __run_batch(self, batch):
+		passwords_file_paths = []
+		try:
+			for cmd, params, host, port, user, passwords in batch.commands:
+				passwords_file_paths.append(
+					self.__write_passwords(passwords) if passwords is not None
+					else None
+				)
+			with tracing.span(
+				"asadmin.batch",
+				host=self.__ssh_ip_address,
+				command=" ".join(cmd for cmd, *options in batch.commands)
+			):
+				started = time.monotonic()
+				channel = self.__ssh_client.get_transport().open_session()
+				channel.set_combine_stderr(True)
+				channel.exec_command(
+					"$HOME/bin/asadmin --interactive false multimode"
+				)
+				script = self.__multimode_script(batch, passwords_file_paths)
+				channel.sendall(script.encode("UTF-8"))
+				channel.shutdown_write()
 
+				commands = iter(batch.commands)
+				results = []
+				lines = []
+				for stream, line in self.__drain(channel):
+					status = re.match(
+						r"^Command (\S+) (executed successfully|failed)\.?$",
+						line
+					)
+					if status is None:
+						if len(line) > 0:
+							print(line)
+							lines.append(line)
+						continue
+					finished = time.monotonic()
+					if status.group(1) not in ("export", "unset"):
+						print(line)
+						results.append(CommandResult(
+							next(commands)[0],
+							1 if status.group(2) == "failed" else 0,
+							lines,
+							[],
+							started,
+							finished
+						))
+					lines = []
+					started = finished
+				channel.recv_exit_status()
+				channel.close()
 		finally:
-			if passwords_file_path is not None:
-				self.__ssh_client.exec_command("rm {}".format(passwords_file_path))
-
-	def __install_stored_master_password(self, domain_name, node_name,
-			node_host):
-		cmd = "" \
-			"ssh -oStrictHostKeyChecking=no glassfish@{} " \
-			"'mkdir -p /var/glassfish/nodes/{}/agent'".format(
-			node_host,
-			node_name
+			for passwords_file_path in passwords_file_paths:
+				if passwords_file_path is not None:
+					self.__remove_file(passwords_file_path)
+		batch.complete(results)
+
+		failed = [
+			result for result, accepted in zip(results, batch.accepted)
+			if not result.succeeded and not result.matches(accepted)
+		]
+		failed.extend(
+			CommandResult(cmd, None, [], [], started, started)
+			for cmd, params, host, port, user, passwords in commands
 		)
-		print(cmd)
-		stdin, stdout, stderr = self.__ssh_client.exec_command(cmd)
-		line = stderr.readline().strip()
-		while len(line) > 0:
-			print(line)
-			line = stderr.readline().strip()
-
-		cmd = "" \
-			"scp -oStrictHostKeyChecking=no {}/{}/config/master-password " \
-			"glassfish@{}:{}/{}/agent".format(
-				self.__domain_dir,
-				domain_name,
-				node_host,
-				self.__node_dir,
-				node_name
+		if len(failed) > 0:
+			raise AsAdminError(failed)
+
+	@contextlib.contextmanager
+	def batch(self):
+		if self.__batch is not None:
+			raise ValueError("asadmin batch already in progress")
+		batch = Batch()
+		self.__batch = batch
+		try:
+			yield batch
+		finally:
+			self.__batch = None
+		self.__run_batch(batch)
+
+	def __makedirs(self, path):
+		parent = ""
+		for part in path.strip("/").split("/"):
+			parent = "{}/{}".format(parent, part)
+			try:
+				self.__sftp().stat(parent)
+			except FileNotFoundError:
+				self.__sftp().mkdir(parent)
+
+	def read_master_password(self, domain_name):
+		with self.__sftp().open("{}/{}/config/master-password".format(
+			self.__domain_dir,
+			domain_name
+		), "rb") as f:
+			return f.read()
+
+	def install_master_password(self, node_name, content):
+		agent_dir = "{}/{}/agent".format(self.__node_dir, node_name)
+		path = "{}/master-password".format(agent_dir)
+		with tracing.span(
+			"sftp.put",
+			host=self.__ssh_ip_address,
+			path=path,
+			bytes=len(content)
+		):
+			started = time.monotonic()
+			self.__makedirs(agent_dir)
+			with self.__sftp().open(path, "wb") as f:
+				f.chmod(0o600)
+				f.write(content)
+			with self.__sftp().open(path, "rb") as f:
+				remote_digest = hashlib.sha256(f.read()).hexdigest()
+			transfer = FileTransfer(
+				self.__ssh_ip_address,
+				path,
+				len(content),
+				hashlib.sha256(content).hexdigest(),
+				remote_digest,
+				started,
+				time.monotonic()
 			)
-		print(cmd)
-		stdin, stdout, stderr = self.__ssh_client.exec_command(cmd)
-		line = stderr.readline().strip()
-		while len(line) > 0:
-			print(line)
-			line = stderr.readline().strip()
+		if not transfer.verified:
+			raise TransferError(transfer)
+		return transfer
 
 	@property
 	def ssh_ip_address(self):
@@ -132,10 +590,9 @@ class AsAdmin:
 			"true" if generate_key else "false"
 		])
 		params.extend(hosts)
-		for line in self.__run("setup-ssh", params, passwords={
+		return self.__call("setup-ssh", params, passwords={
 			"AS_ADMIN_SSHPASSWORD": password
-		} if password is not None else None):
-			pass
+		} if password is not None else None)
 
 	def list_domains(self):
 		params = []
@@ -157,7 +614,7 @@ class AsAdmin:
 		params.extend([ "--usemasterpassword", "true" ])
 		params.extend([ "--savemasterpassword", "true" ])
 		params.append(name)
-		for line in self.__run(
+		return self.__call(
 			"create-domain",
 			params,
 			host=host,
@@ -165,8 +622,7 @@ class AsAdmin:
 			passwords={
 				"AS_ADMIN_MASTERPASSWORD": master_password,
 				"AS_ADMIN_PASSWORD": admin_password
-		}):
-			print(line)
+		})
 
 	def list_nodes_ssh(self, admin_host, admin_port, admin_user,
 			admin_password):
@@ -189,15 +645,13 @@ class AsAdmin:
 					"host": values[2]
 				}
 
-	# TODO Restore domain_name from admin_host:admin_port with asking for...
-	# ...  own domain name and remove parameter
 	def create_node_ssh(self, admin_host, admin_port, admin_user,
-			admin_password, host, name, domain_name):
+			admin_password, host, name):
 		params = []
 		params.extend([ "--nodehost", host ])
 		params.extend([ "--nodedir", self.__node_dir ])
 		params.append(name)
-		for line in self.__run(
+		result = self.__call(
 			"create-node-ssh",
 			params,
 			host=admin_host,
@@ -205,48 +659,60 @@ class AsAdmin:
 			user=admin_user,
 			passwords={
 				"AS_ADMIN_PASSWORD": admin_password
-		}):
-			print(line)
-		self.__install_stored_master_password(domain_name, name, host)
+		})
+		return result
+
+	def delete_node_ssh(self, admin_host, admin_port, admin_user,
+			admin_password, name):
+		params = []
+		params.append(name)
+		return self.__call(
+			"delete-node-ssh",
+			params,
+			host=admin_host,
+			port=admin_port,
+			user=admin_user,
+			passwords={
+				"AS_ADMIN_PASSWORD": admin_password
+		})
 
 	def start_domain(self, name, master_password):
 		params = []
 		params.append(name)
-		for line in self.__run(
+		return self.__call(
 			"start-domain",
 			params,
 			passwords={
 				"AS_ADMIN_MASTERPASSWORD": master_password
-		}):
-			print(line)
+			},
+			accepted=ALREADY_RUNNING
+		)
 
 	def stop_domain(self, name, master_password):
 		params = []
 		params.append(name)
-		for line in self.__run(
+		return self.__call(
 			"stop-domain",
 			params,
 			passwords={
 				"AS_ADMIN_MASTERPASSWORD": master_password
-		}):
-			print(line)
+		})
 
 	def restart_domain(self, name, master_password):
 		params = []
 		params.append(name)
-		for line in self.__run(
+		return self.__call(
 			"restart-domain",
 			params,
 			passwords={
 				"AS_ADMIN_MASTERPASSWORD": master_password
-		}):
-			print(line)
+		})
 
 	def start_cluster(self, admin_host, admin_port, admin_user, admin_password,
 			name, master_password):
 		params = []
 		params.append(name)
-		for line in self.__run(
+		return self.__call(
 			"start-cluster",
 			params,
 			host=admin_host,
@@ -255,14 +721,13 @@ class AsAdmin:
 			passwords={
 				"AS_ADMIN_MASTERPASSWORD": master_password,
 				"AS_ADMIN_PASSWORD": admin_password
-		}):
-			print(line)
+		})
 
 	def stop_cluster(self, admin_host, admin_port, admin_user, admin_password,
 			name, master_password):
 		params = []
 		params.append(name)
-		for line in self.__run(
+		return self.__call(
 			"stop-cluster",
 			params,
 			host=admin_host,
@@ -271,26 +736,24 @@ class AsAdmin:
 			passwords={
 				"AS_ADMIN_MASTERPASSWORD": master_password,
 				"AS_ADMIN_PASSWORD": admin_password
-		}):
-			print(line)
+		})
 
 	def enable_secure_admin(self, admin_host, admin_port, admin_user,
 			admin_password):
-		for line in self.__run(
+		return self.__call(
 			"enable-secure-admin",
 			host=admin_host,
 			port=admin_port,
 			user=admin_user,
 			passwords={
 				"AS_ADMIN_PASSWORD": admin_password
-		}):
-			print(line)
+		})
 
 	def set(self, admin_host, admin_port, admin_user, admin_password, name,
 			value):
 		params = []
 		params.append("{}={}".format(name, value))
-		for line in self.__run(
+		return self.__call(
 			"set",
 			params,
 			host=admin_host,
@@ -298,5 +761,4 @@ class AsAdmin:
 			user=admin_user,
 			passwords={
 				"AS_ADMIN_PASSWORD": admin_password
-		}):
-			print(line)
+		})
@@ -1,7 +1,33 @@
+import concurrent.futures
 import json
+import os
 import requests
+import requests.adapters
+import threading
 import time
 
+from tools.glassfish import readiness
+from tools import tracing
+from tools.http import multipart
+
+DIGEST_PROPERTY = "pto.artifact.sha1"
+HTTP_LISTENER_PORT = "28080"
+
+class RollingDeployError(Exception):
+
+	def __init__(self, name, version, switched, cause):
+		super().__init__(
+			"Rolling deploy of {} rolled back after {}: {}".format(
+				version,
+				", ".join(switched),
+				cause
+			)
+		)
+		self.name = name
+		self.version = version
+		self.switched = switched
+		self.cause = cause
+
 class Domain:
 
 	def __init__(self, machines, machine_das, master_password, name, admin_host,
@@ -19,26 +45,35 @@ class Domain:
 	def name(self):
 		return self.__name
 
+	@property
+	def admin_host(self):
+		return self.__admin_host
+
+	@property
+	def running(self):
+		return self.__running
+
 	def prepare(self, admin, admin_user, admin_password):
-		admin.start_domain(self.__name, self.__master_password)
-		admin.enable_secure_admin(
-			self.__admin_host,
-			self.__admin_port,
-			admin_user,
-			admin_password
-		)
-		admin.set(
-			self.__admin_host,
-			self.__admin_port,
-			admin_user,
-			admin_password,
-			"configs.config.server-config.network-config.network-listeners."
-			"network-listener.admin-listener.address",
-			admin.ssh_ip_address
-		)
-		admin.stop_domain(self.__name, self.__master_password)
+		with admin.batch():
+			admin.start_domain(self.__name, self.__master_password)
+			admin.enable_secure_admin(
+				self.__admin_host,
+				self.__admin_port,
+				admin_user,
+				admin_password
+			)
+			admin.set(
+				self.__admin_host,
+				self.__admin_port,
+				admin_user,
+				admin_password,
+				"configs.config.server-config.network-config.network-listeners."
+				"network-listener.admin-listener.address",
+				admin.ssh_ip_address
+			)
+			admin.stop_domain(self.__name, self.__master_password)
 
-	def manage(self, admin_user, admin_password):
+	def manage(self, admin_user, admin_password, concurrency=8):
 		domain_mgr = DomainManager(
 			self.__name,
 			self.__machines,
@@ -47,7 +82,8 @@ class Domain:
 			self.__admin_host,
 			self.__admin_port,
 			admin_user,
-			admin_password
+			admin_password,
+			concurrency=concurrency
 		)
 		if not self.__running:
 			domain_mgr.start()
@@ -62,18 +98,39 @@ class ManagedDomain:
 	def __init__(self, domain_mgr):
 		self.__domain_mgr = domain_mgr
 
-	def nodes(self):
-		yield from self.__domain_mgr.list_nodes()
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, tp):
+		self.close()
+
+	def close(self):
+		self.__domain_mgr.close()
+
+	def topology(self, refresh=False):
+		return self.__domain_mgr.topology(refresh)
+
+	def nodes(self, ping=True):
+		yield from self.__domain_mgr.list_nodes(ping)
 
 	def clusters(self):
 		yield from self.__domain_mgr.list_clusters()
 
+	def cluster(self, name):
+		return Cluster(self.__domain_mgr, name)
+
 	def create_node(self, name):
 		return self.__domain_mgr.create_node(name)
 
+	def create_nodes(self, names):
+		return self.__domain_mgr.create_nodes(names)
+
 	def create_cluster(self, name):
 		return self.__domain_mgr.create_cluster(name)
 
+	def delete_nodes(self, names):
+		return self.__domain_mgr.delete_nodes(names)
+
 class Node:
 
 	def __init__(self, domain_mgr, name, host):
@@ -85,8 +142,13 @@ class Node:
 	def name(self):
 		return self.__name
 
+	@property
+	def host(self):
+		return self.__host
+
 	def instances(self):
-		yield from self.__domain_mgr.list_instances(self.__name)
+		for name in self.__domain_mgr.topology().node_servers(self.__name):
+			yield Instance(self.__domain_mgr, name)
 
 	def create_instance(self, name, cluster):
 		return cluster.create_instance(name, self.__name)
@@ -101,12 +163,140 @@ class Cluster:
 	def name(self):
 		return self.__name
 
+	def instances(self):
+		for name in self.__domain_mgr.topology().cluster_servers(self.__name):
+			yield Instance(self.__domain_mgr, name)
+
 	def create_instance(self, name, node_name):
 		return self.__domain_mgr.create_instance(name, node_name, self.__name)
 
+	def delete_instance(self, name):
+		return self.__domain_mgr.delete_instance(name)
+
+	def config(self, resource):
+		return self.__domain_mgr.cluster_config(self.__name, resource)
+
+	def configure(self, resource, values):
+		self.__domain_mgr.configure_cluster(self.__name, resource, values)
+
+	def applications(self):
+		return self.__domain_mgr.cluster_applications(self.__name)
+
+	def instance_states(self):
+		return self.__domain_mgr.instance_states(self.__name)
+
+	def __versions(self, name):
+		return [
+			app_name
+			for app_name in self.applications()
+			if app_name == name or app_name.startswith("{}:".format(name))
+		]
+
+	def application_version(self, name):
+		versions = self.__versions(name)
+		if len(versions) > 1:
+			versions = [
+				app_name
+				for app_name in versions
+				if self.__domain_mgr.application_enabled(self.__name, app_name)
+			]
+		return versions[0] if len(versions) > 0 else None
+
+	def application_digest(self, name):
+		version = self.application_version(name)
+		if version is None:
+			return None
+		return self.__domain_mgr.application_digest(version)
+
 	def deploy(self, name, artifact, context_root=None, force=False):
+		digest = artifact.digest()
+		if not force and self.application_digest(name) == digest:
+			print("Application {} is up to date on {}".format(
+				name,
+				self.__name
+			))
+			return False
 		with artifact.open() as f:
-			self.__domain_mgr.deploy(self.__name, name, f, context_root, force)
+			self.__domain_mgr.deploy(self.__name, name, f, context_root, digest)
+		return True
+
+	def rolling_deploy(self, name, artifact, context_root=None, batch_size=1,
+			floor=0, probe_deadline=readiness.DEFAULT_DEADLINE, force=False):
+		digest = artifact.digest()
+		current = self.application_version(name)
+		if current is None:
+			return self.deploy(name, artifact, context_root, force)
+		version = "{}:{}".format(name, digest[:12])
+		if self.__domain_mgr.application_digest(current) == digest:
+			if not force:
+				print("Application {} is up to date on {}".format(
+					name,
+					self.__name
+				))
+				return False
+			if current == version:
+				version = "{}-{}".format(version, int(time.time()))
+		states = self.instance_states()
+		serving = sorted(
+			inst_name
+			for inst_name, state in states.items()
+			if state == "RUNNING"
+		)
+		if len(serving) == 0:
+			with artifact.open() as f:
+				self.__domain_mgr.deploy(
+					self.__name,
+					version,
+					f,
+					context_root,
+					digest
+				)
+			self.__undeploy_versions(name, version)
+			return True
+		batch_size = min(batch_size, len(serving) - floor)
+		if batch_size < 1:
+			raise ValueError(
+				"Cannot keep {} of {} instances of {} serving".format(
+					floor,
+					len(serving),
+					self.__name
+				)
+			)
+		with artifact.open() as f:
+			self.__domain_mgr.deploy(
+				self.__name,
+				version,
+				f,
+				context_root,
+				digest,
+				enabled=False
+			)
+		switched = []
+		try:
+			for i in range(0, len(serving), batch_size):
+				batch = serving[i:i + batch_size]
+				for inst_name in batch:
+					switched.append(inst_name)
+					self.__domain_mgr.enable_application(version, inst_name)
+				self.__domain_mgr.wait_instances(
+					batch,
+					context_root,
+					probe_deadline
+				)
+			self.__domain_mgr.enable_application(version, self.__name)
+		except (OSError, LookupError) as e:
+			for inst_name in switched:
+				self.__domain_mgr.enable_application(current, inst_name)
+			self.__domain_mgr.enable_application(current, self.__name)
+			self.__domain_mgr.undeploy(version, self.__name)
+			raise RollingDeployError(name, version, switched, e)
+		self.__undeploy_versions(name, version)
+		return True
+
+	def __undeploy_versions(self, name, version):
+		for app_name in self.__versions(name):
+			if app_name != version:
+				self.__domain_mgr.undeploy(app_name, self.__name)
 
 	def start(self):
 		self.__domain_mgr.start_cluster(self.__name)
@@ -121,10 +311,100 @@ class Instance:
 	def name(self):
 		return self.__name
 
+class Topology:
+
+	def __init__(self, nodes, clusters, servers):
+		self.__lock = threading.Lock()
+		self.__nodes = {}
+		self.__clusters = {}
+		self.__servers = {}
+		self.__config_clusters = {}
+		self.__node_servers = {}
+		self.__cluster_servers = {}
+		for name, entity in nodes.items():
+			self.add_node(name, entity)
+		for name, entity in clusters.items():
+			self.add_cluster(name, entity)
+		for name, entity in servers.items():
+			self.add_server(name, entity)
+
+	def node_names(self):
+		return list(self.__nodes)
+
+	def node_host(self, name):
+		return self.__nodes[name].get("nodeHost")
+
+	def cluster_names(self):
+		return list(self.__clusters)
+
+	def server_names(self):
+		return list(self.__servers)
+
+	def config_ref(self, name):
+		if name in self.__clusters:
+			return self.__clusters[name].get("configRef")
+		return self.__servers[name].get("configRef")
+
+	def server_node(self, name):
+		return self.__servers[name].get("nodeRef")
+
+	def server_cluster(self, name):
+		return self.__config_clusters.get(self.config_ref(name))
+
+	def node_servers(self, node_name):
+		return list(self.__node_servers.get(node_name, ()))
+
+	def cluster_servers(self, cluster_name):
+		return list(self.__cluster_servers.get(cluster_name, ()))
+
+	def add_node(self, name, entity):
+		with self.__lock:
+			self.__nodes[name] = entity
+
+	def add_cluster(self, name, entity):
+		with self.__lock:
+			self.__clusters[name] = entity
+			config_ref = entity.get("configRef")
+			if config_ref is not None:
+				self.__config_clusters[config_ref] = name
+				for server_name, server in self.__servers.items():
+					if server.get("configRef") == config_ref:
+						self.__cluster_servers.setdefault(name, []).append(
+							server_name
+						)
+
+	def remove_node(self, name):
+		with self.__lock:
+			self.__nodes.pop(name, None)
+			self.__node_servers.pop(name, None)
+
+	def remove_server(self, name):
+		with self.__lock:
+			entity = self.__servers.pop(name, None)
+			if entity is None:
+				return
+			self.__node_servers.get(entity.get("nodeRef"), []).remove(name)
+			cluster_name = self.__config_clusters.get(entity.get("configRef"))
+			if cluster_name is not None:
+				self.__cluster_servers[cluster_name].remove(name)
+
+	def add_server(self, name, entity):
+		with self.__lock:
+			self.__servers[name] = entity
+			self.__node_servers.setdefault(entity.get("nodeRef"), []).append(
+				name
+			)
+			cluster_name = self.__config_clusters.get(entity.get("configRef"))
+			if cluster_name is not None:
+				self.__cluster_servers.setdefault(cluster_name, []).append(
+					name
+				)
+
 class DomainManager:
 
 	def __init__(self, name, machines, machine_das, master_password, admin_host,
-			admin_port, admin_user, admin_password):
+			admin_port, admin_user, admin_password, pool_size=10,
+			concurrency=8):
 		self.__name = name
 		self.__machines = machines
 		self.__machine_das = machine_das
@@ -133,6 +413,31 @@ class DomainManager:
 		self.__admin_port = admin_port
 		self.__admin_user = admin_user
 		self.__admin_password = admin_password
+		self.__session = self.__create_session(max(pool_size, concurrency))
+		self.__executor = concurrent.futures.ThreadPoolExecutor(
+			max_workers=concurrency
+		)
+		self.__topology = None
+		self.__topology_lock = threading.Lock()
+
+	def __create_session(self, pool_size):
+		session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(
+			pool_connections=1,
+			pool_maxsize=pool_size
+		)
+		session.mount("https://", adapter)
+		session.mount("http://", adapter)
+		session.headers.update({
+			"Accept": "application/json",
+			"X-Requested-By": "GlassFish REST HTML interface"
+		})
+		session.auth = requests.auth.HTTPBasicAuth(
+			self.__admin_user,
+			self.__admin_password
+		)
+		session.verify = False
+		return session
 
 	def __target(self, path):
 		return "https://{}:{}/management/domain{}".format(
@@ -141,11 +446,43 @@ class DomainManager:
 			path
 		)
 
-	def __auth(self):
-		return requests.auth.HTTPBasicAuth(
-			self.__admin_user,
-			self.__admin_password
-		)
+	def __get(self, url, timeout=None, params=None):
+		with tracing.span("rest.get", url=url) as span:
+			resp = self.__session.get(url, timeout=timeout, params=params)
+			span.set(status=resp.status_code, bytes=len(resp.content))
+			return resp
+
+	def __post(self, url, data=None, files=None, headers=None):
+		with tracing.span("rest.post", url=url) as span:
+			resp = self.__session.post(
+				url,
+				data=data,
+				files=files,
+				headers=headers
+			)
+			span.set(status=resp.status_code, bytes=len(resp.content))
+			if isinstance(data, multipart.MultipartEncoder):
+				span.set(sent=len(data))
+			return resp
+
+	def __delete(self, url):
+		with tracing.span("rest.delete", url=url) as span:
+			resp = self.__session.delete(url)
+			span.set(status=resp.status_code, bytes=len(resp.content))
+			return resp
+
+	def __upload_progress(self, name):
+		reported = [ -1 ]
+		def progress(encoder):
+			percent = encoder.sent * 100 // len(encoder)
+			if percent // 10 > reported[0] // 10 or encoder.sent == len(encoder):
+				reported[0] = percent
+				print("Uploading {}: {}% ({:.1f} MiB/s)".format(
+					name,
+					percent,
+					encoder.throughput / (1 << 20)
+				))
+		return progress
 
 	def __node_asadmin(self, node_name):
 		with self.__machine_das.asadmin() as admin:
@@ -159,33 +496,63 @@ class DomainManager:
 					return self.__machines.asadmin(node_info["host"])
 			raise LookupError("Node '{}' was not found".format(node_name))
 
-	def __node_available(self, node_name):
-		resp = requests.get(
-			self.__target("/nodes/node/{}/ping-node-ssh".format(node_name)),
-			headers={
-				"Accept": "application/json",
-				"X-Requested-By": "GlassFish REST HTML interface"
-			},
-			verify=False,
-			auth=self.__auth()
-		)
+	def __node_available(self, node_name, timeout):
+		try:
+			resp = self.__get(self.__target(
+				"/nodes/node/{}/ping-node-ssh".format(node_name)
+			), timeout)
+		except requests.exceptions.Timeout:
+			return False
 		return resp.json()["exit_code"] == "SUCCESS"
 
+	def __check(self, resp, action):
+		if resp.status_code >= 400 or resp.json()["exit_code"] != "SUCCESS":
+			raise requests.exceptions.HTTPError(
+				"{} failed with status {}: {}".format(
+					action,
+					resp.status_code,
+					resp.json().get("message")
+				),
+				response=resp
+			)
+		return resp
+
 	def __entity(self, resp):
 		return resp.json()["extraProperties"]["entity"]
 
-	def __child_resources(self, resp):
-		extraProperties = resp.json()["extraProperties"]
-		for name, url in extraProperties["childResources"].items():
-			yield name, requests.get(
-				url,
-				headers={
-					"Accept": "application/json",
-					"X-Requested-By": "GlassFish REST HTML interface"
-				},
-				verify=False,
-				auth=self.__auth()
-			)
+	def __snapshot(self):
+		collections = [
+			self.__get(self.__target(path)).json()["extraProperties"]
+			for path in ("/nodes/node", "/clusters/cluster", "/servers/server")
+		]
+		children = [
+			list(extraProperties["childResources"].items())
+			for extraProperties in collections
+		]
+		entities = iter(self.__executor.map(
+			lambda url: self.__entity(self.__get(url)),
+			(url for items in children for name, url in items)
+		))
+		nodes, clusters, servers = (
+			{ name: next(entities) for name, url in items }
+			for items in children
+		)
+		return Topology(nodes, clusters, servers)
+
+	def __known(self, update, *args):
+		with self.__topology_lock:
+			if self.__topology is not None:
+				update(self.__topology, *args)
+
+	def topology(self, refresh=False):
+		with self.__topology_lock:
+			if self.__topology is None or refresh:
+				self.__topology = self.__snapshot()
+			return self.__topology
+
+	def close(self):
+		self.__executor.shutdown()
+		self.__session.close()
 
 	def start(self):
 		with self.__machine_das.asadmin() as admin:
@@ -199,130 +566,161 @@ class DomainManager:
 		with self.__machine_das.asadmin() as admin:
 			admin.restart_domain(self.__name, self.__master_password)
 
-	def list_nodes(self):
-		resp = requests.get(
-			self.__target("/nodes/node"),
-			headers={
-				"Accept": "application/json",
-				"X-Requested-By": "GlassFish REST HTML interface"
-			},
-			verify=False,
-			auth=self.__auth()
-		)
-		for name, sub_resp in self.__child_resources(resp):
-			if self.__node_available(name):
-				yield Node(self, name, self.__entity(sub_resp)["nodeHost"])
+	def list_nodes(self, ping=True, ping_timeout=30.0):
+		topology = self.topology()
+		if not ping:
+			for name in topology.node_names():
+				yield Node(self, name, topology.node_host(name))
+			return
+		pings = {
+			self.__executor.submit(self.__node_available, name, ping_timeout):
+			name
+			for name in topology.node_names()
+		}
+		for future in concurrent.futures.as_completed(pings):
+			name = pings[future]
+			if future.result():
+				yield Node(self, name, topology.node_host(name))
 
-	def create_node(self, name):
+	def __node_machine(self, name):
 		machine = self.__machines.machine_inst(
 			name, [
 				self.__machine_das.public_key_path
-			]
+			],
+			self.__name
 		)
-		# XXX Race condition: Waiting SSH node server to be ready for...
-		# ... subsequent connections
-		time.sleep(5)
+		readiness.wait_ssh(machine.ip_address, machine.ssh_port)
+		return machine
+
+	def __install_master_passwords(self, nodes):
+		if len(nodes) == 0:
+			return
 		with self.__machine_das.asadmin() as admin:
-			admin.create_node_ssh(
-				self.__admin_host,
-				self.__admin_port,
-				self.__admin_user,
-				self.__admin_password,
-				machine.ip_address,
-				name,
-				self.__name
-			)
-			return Node(self, name, machine.ip_address)
+			content = admin.read_master_password(self.__name)
+		def install(node):
+			name, host = node
+			with self.__machines.asadmin(host) as admin:
+				return admin.install_master_password(name, content)
+		for transfer in self.__executor.map(install, nodes):
+			print(transfer)
+
+	def create_node(self, name):
+		return self.create_nodes([ name ])[0]
+
+	def create_nodes(self, names):
+		if len(names) > 1 and self.__machines.golden_pending(self.__name):
+			nodes = self.__create_node_batch(names[:1])
+			return nodes + self.__create_node_batch(names[1:])
+		return self.__create_node_batch(names)
+
+	def __create_node_batch(self, names):
+		machines = list(self.__executor.map(self.__node_machine, names))
+		with self.__machine_das.asadmin() as admin:
+			with admin.batch():
+				for name, machine in zip(names, machines):
+					admin.create_node_ssh(
+						self.__admin_host,
+						self.__admin_port,
+						self.__admin_user,
+						self.__admin_password,
+						machine.ip_address,
+						name
+					)
+		self.__install_master_passwords([
+			(name, machine.ip_address)
+			for name, machine in zip(names, machines)
+			if not machine.provisioned
+		])
+		for name, machine in zip(names, machines):
+			if not machine.provisioned:
+				self.__machines.commit_golden(self.__name, name)
+				break
+		nodes = []
+		for name, machine in zip(names, machines):
+			self.__known(Topology.add_node, name, {
+				"nodeHost": machine.ip_address
+			})
+			nodes.append(Node(self, name, machine.ip_address))
+		return nodes
+
+	def delete_nodes(self, names):
+		with self.__machine_das.asadmin() as admin:
+			with admin.batch():
+				for name in names:
+					admin.delete_node_ssh(
+						self.__admin_host,
+						self.__admin_port,
+						self.__admin_user,
+						self.__admin_password,
+						name
+					)
+		for name in names:
+			self.__known(Topology.remove_node, name)
+			self.__machines.remove_inst(name)
 
 	def list_clusters(self):
-		resp = requests.get(
-			self.__target("/clusters/cluster"),
-			headers={
-				"Accept": "application/json",
-				"X-Requested-By": "GlassFish REST HTML interface"
-			},
-			verify=False,
-			auth=self.__auth()
-		)
-		for name, sub_resp in self.__child_resources(resp):
+		for name in self.topology().cluster_names():
 			yield Cluster(self, name)
 
 	def create_cluster(self, name):
-		resp = requests.post(
+		resp = self.__post(
 			self.__target("/clusters/create-cluster"),
-			headers={
-				"Accept": "application/json",
-				"X-Requested-By": "GlassFish REST HTML interface"
-			},
-			verify=False,
-			auth=self.__auth(),
 			data={
 				"id": name
 			}
 		)
 
-		resp = requests.get(
-			self.__target("/clusters/cluster/{}".format(name)),
-			headers={
-				"Accept": "application/json",
-				"X-Requested-By": "GlassFish REST HTML interface"
-			},
-			verify=False,
-			auth=self.__auth()
-		)
-		config_ref = self.__entity(resp)["configRef"]
+		resp = self.__get(self.__target(
+			"/clusters/cluster/{}".format(name)
+		))
+		self.__known(Topology.add_cluster, name, self.__entity(resp))
+		return Cluster(self, name)
 
-		resp = requests.get(
-			self.__target("/configs/config/{}/java-config".format(
-				config_ref
+	def cluster_config(self, cluster_name, resource):
+		resp = self.__get(self.__target("/configs/config/{}/{}".format(
+			self.topology().config_ref(cluster_name),
+			resource
+		)))
+		return self.__entity(resp)
+
+	def configure_cluster(self, cluster_name, resource, values):
+		data = self.cluster_config(cluster_name, resource)
+		data.update(values)
+		resp = self.__post(
+			self.__target("/configs/config/{}/{}".format(
+				self.topology().config_ref(cluster_name),
+				resource
 			)),
-			headers={
-				"Accept": "application/json",
-				"X-Requested-By": "GlassFish REST HTML interface"
-			},
-			verify=False,
-			auth=self.__auth()
+			data=data
 		)
-		data = resp.json()["extraProperties"]["entity"]
-		data["debugEnabled"] = "true"
 
-		resp = requests.post(
-			self.__target("/configs/config/{}/java-config".format(
-				config_ref
-			)),
-			headers={
-				"Accept": "application/json",
-				"X-Requested-By": "GlassFish REST HTML interface"
-			},
-			verify=False,
-			auth=self.__auth(),
-			data=data
+	def cluster_applications(self, cluster_name):
+		resp = self.__get(self.__target(
+			"/clusters/cluster/{}/application-ref".format(cluster_name)
+		))
+		extraProperties = resp.json()["extraProperties"]
+		return list(extraProperties.get("childResources", {}))
+
+	def instance_states(self, cluster_name):
+		resp = self.__get(
+			self.__target("/list-instances"),
+			params={
+				"id": cluster_name
+			}
 		)
-		return Cluster(self, name)
+		extraProperties = resp.json()["extraProperties"]
+		return {
+			inst["name"]: inst["status"]
+			for inst in extraProperties.get("instanceList", ())
+		}
 
 	def list_instances(self, node_name):
-		resp = requests.get(
-			self.__target("/servers/server"),
-			headers={
-				"Accept": "application/json",
-				"X-Requested-By": "GlassFish REST HTML interface"
-			},
-			verify=False,
-			auth=self.__auth()
-		)
-		for name, sub_resp in self.__child_resources(resp):
-			if self.__entity(sub_resp)["nodeRef"] == node_name:
-				yield Instance(self, name)
+		for name in self.topology().node_servers(node_name):
+			yield Instance(self, name)
 
 	def create_instance(self, name, node_name, cluster_name):
-		resp = requests.post(
+		resp = self.__post(
 			self.__target("/create-instance"),
-			headers={
-				"Accept": "application/json",
-				"X-Requested-By": "GlassFish REST HTML interface"
-			},
-			verify=False,
-			auth=self.__auth(),
 			data={
 				"id": name,
 				"nodeagent": node_name,
@@ -330,41 +728,116 @@ class DomainManager:
 			}
 		)
 		print(resp.json())
-		return None
+		resp = self.__get(self.__target("/servers/server/{}".format(name)))
+		self.__known(Topology.add_server, name, self.__entity(resp))
+		return Instance(self, name)
+
+	def delete_instance(self, name):
+		node_name = self.topology().server_node(name)
+		resp = self.__post(self.__target(
+			"/servers/server/{}/stop-instance".format(name)
+		))
+		print(resp.json())
+		resp = self.__delete(self.__target(
+			"/servers/server/{}/delete-instance".format(name)
+		))
+		print(resp.json())
+		self.__known(Topology.remove_server, name)
+		return node_name
 
 	def start_cluster(self, cluster_name):
-		resp = requests.post(
+		resp = self.__post(
 			self.__target("/clusters/cluster/{}/start-cluster".format(
 				cluster_name
-			)),
-			headers={
-				"Accept": "application/json",
-				"X-Requested-By": "GlassFish REST HTML interface"
-			},
-			verify=False,
-			auth=self.__auth()
+			))
 		)
 		print(resp.json())
 		return None
 
-	def deploy(self, target, name, artifact_file, context_root, force):
+	def application_digest(self, name):
+		resp = self.__get(self.__target(
+			"/applications/application/{}/property".format(name)
+		))
+		if resp.status_code == 404:
+			return None
+		extraProperties = resp.json()["extraProperties"]
+		for prop in extraProperties.get("properties", ()):
+			if prop["name"] == DIGEST_PROPERTY:
+				return prop["value"]
+		return None
+
+	def deploy(self, target, name, artifact_file, context_root, digest,
+			enabled=True):
 		data = {
 			"target": target,
 			"name": name,
-			"force": "true" if force else "false"
+			"force": "true",
+			"enabled": "true" if enabled else "false",
+			"properties": "{}={}".format(DIGEST_PROPERTY, digest)
 		}
 		if context_root is not None:
 			data["contextroot"] = context_root
-		resp = requests.post(
+		encoder = multipart.MultipartEncoder(
+			fields=data,
+			files={
+				"id": (
+					os.path.basename(artifact_file.name),
+					artifact_file,
+					"application/octet-stream"
+				)
+			},
+			progress=self.__upload_progress(name)
+		)
+		resp = self.__post(
 			self.__target("/applications/application"),
+			data=encoder,
 			headers={
-				"Accept": "application/json",
-				"X-Requested-By": "GlassFish REST HTML interface"
-			},
-			verify=False,
-			auth=self.__auth(),
-			data=data,
-			files={
-				"id": artifact_file
+				"Content-Type": encoder.content_type
 			}
 		)
+		self.__check(resp, "Deploying {}".format(name))
+
+	def application_enabled(self, cluster_name, name):
+		resp = self.__get(self.__target(
+			"/clusters/cluster/{}/application-ref/{}".format(cluster_name, name)
+		))
+		return self.__entity(resp).get("enabled") == "true"
+
+	def enable_application(self, name, target):
+		resp = self.__post(
+			self.__target("/applications/application/{}/enable".format(name)),
+			data={
+				"target": target
+			}
+		)
+		self.__check(resp, "Enabling {} on {}".format(name, target))
+
+	def undeploy(self, name, target):
+		resp = self.__delete(self.__target(
+			"/applications/application/{}?target={}".format(name, target)
+		))
+		self.__check(resp, "Undeploying {} from {}".format(name, target))
+
+	def instance_url(self, name, context_root):
+		resp = self.__get(self.__target(
+			"/servers/server/{}/system-properties".format(name)
+		))
+		extraProperties = resp.json()["extraProperties"]
+		port = HTTP_LISTENER_PORT
+		for prop in extraProperties.get("systemProperties", ()):
+			if prop["name"] == "HTTP_LISTENER_PORT":
+				port = prop.get("value") or prop.get("defaultValue") or port
+		topology = self.topology()
+		return "http://{}:{}{}/".format(
+			topology.node_host(topology.server_node(name)),
+			port,
+			(context_root or "").rstrip("/")
+		)
+
+	def wait_instances(self, names, context_root, deadline):
+		urls = [ self.instance_url(name, context_root) for name in names ]
+		for ready in self.__executor.map(
+			lambda url: readiness.wait_http(url, deadline),
+			urls
+		):
+			print(ready)
@@ -0,0 +1,199 @@
+import asyncio
+import concurrent.futures
+import functools
+import weakref
+
+from tools.glassfish import state
+
+class DomainReport:
+
+	def __init__(self, environment, domain_name, running=True, nodes=(),
+			instance_states=None, changes=None, error=None):
+		self.__environment = environment
+		self.__domain_name = domain_name
+		self.__running = running
+		self.__nodes = list(nodes)
+		self.__instance_states = instance_states or {}
+		self.__changes = changes
+		self.__error = error
+
+	@property
+	def environment(self):
+		return self.__environment
+
+	@property
+	def domain_name(self):
+		return self.__domain_name
+
+	@property
+	def running(self):
+		return self.__running
+
+	@property
+	def nodes(self):
+		return self.__nodes
+
+	@property
+	def instance_states(self):
+		return self.__instance_states
+
+	@property
+	def changes(self):
+		return self.__changes
+
+	@property
+	def error(self):
+		return self.__error
+
+	def __str__(self):
+		title = "{}/{}".format(self.__environment, self.__domain_name)
+		if self.__error is not None:
+			return "{}: failed: {}".format(title, self.__error)
+		if not self.__running:
+			return "{}: not running".format(title)
+		lines = [ "{}: {} node(s)".format(title, len(self.__nodes)) ]
+		lines.extend(
+			"  {} {}".format(cluster_name, ", ".join(
+				"{} {}".format(inst_name, inst_state)
+				for inst_name, inst_state in sorted(states.items())
+			))
+			for cluster_name, states in sorted(self.__instance_states.items())
+		)
+		if self.__changes is not None:
+			lines.extend(
+				"  {}".format(line)
+				for line in str(self.__changes).splitlines()
+			)
+		return "\n".join(lines)
+
+class Fleet:
+
+	def __init__(self, agents, admin_user, admin_password, host_limit=4,
+			max_workers=32):
+		self.__agents = dict(agents)
+		self.__admin_user = admin_user
+		self.__admin_password = admin_password
+		self.__host_limit = host_limit
+		self.__executor = concurrent.futures.ThreadPoolExecutor(
+			max_workers=max_workers
+		)
+		self.__semaphores = weakref.WeakKeyDictionary()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, tp):
+		self.close()
+
+	def __semaphore(self, key):
+		semaphores = self.__semaphores.setdefault(
+			asyncio.get_running_loop(),
+			{}
+		)
+		semaphore = semaphores.get(key)
+		if semaphore is None:
+			semaphore = asyncio.Semaphore(self.__host_limit)
+			semaphores[key] = semaphore
+		return semaphore
+
+	async def __offload(self, key, fn, *args):
+		async with self.__semaphore(key):
+			return await asyncio.get_running_loop().run_in_executor(
+				self.__executor,
+				functools.partial(fn, *args)
+			)
+
+	async def __domains(self, env_name):
+		agent = self.__agents[env_name]
+		return await self.__offload(
+			(env_name, None),
+			lambda: list(agent.domains())
+		)
+
+	async def __each(self, fn, env_names=None):
+		env_names = list(env_names or self.__agents)
+		found = await asyncio.gather(*(
+			self.__domains(env_name)
+			for env_name in env_names
+		), return_exceptions=True)
+		reports = []
+		tasks = []
+		for env_name, domains in zip(env_names, found):
+			if isinstance(domains, Exception):
+				reports.append(DomainReport(env_name, None, error=domains))
+				continue
+			tasks.extend(
+				(env_name, d, fn(env_name, d))
+				for d in domains
+			)
+		results = await asyncio.gather(*(
+			task
+			for env_name, d, task in tasks
+		), return_exceptions=True)
+		for (env_name, d, task), result in zip(tasks, results):
+			if isinstance(result, Exception):
+				result = DomainReport(env_name, d.name, error=result)
+			if result is not None:
+				reports.append(result)
+		return reports
+
+	def __inspect(self, env_name, d, desired=None, execute=False):
+		if not d.running and desired is None:
+			return DomainReport(env_name, d.name, running=False)
+		with d.manage(self.__admin_user, self.__admin_password) as mgd_domain:
+			changes = None
+			if desired is not None:
+				changes = state.plan(mgd_domain, desired)
+				if execute:
+					changes.execute()
+					mgd_domain.topology(refresh=True)
+			topology = mgd_domain.topology()
+			return DomainReport(
+				env_name,
+				d.name,
+				nodes=topology.node_names(),
+				instance_states={
+					cluster_name:
+					mgd_domain.cluster(cluster_name).instance_states()
+					for cluster_name in topology.cluster_names()
+				},
+				changes=changes
+			)
+
+	async def discover(self):
+		env_names = list(self.__agents)
+		found = await asyncio.gather(*(
+			self.__domains(env_name)
+			for env_name in env_names
+		))
+		return dict(zip(env_names, found))
+
+	async def report(self, env_names=None):
+		async def report(env_name, d):
+			return await self.__offload(
+				(env_name, d.admin_host),
+				self.__inspect,
+				env_name,
+				d
+			)
+		return await self.__each(report, env_names)
+
+	async def update(self, desired_states, execute=True):
+		async def update(env_name, d):
+			desired = desired_states.get(env_name, {}).get(d.name)
+			if desired is None:
+				return None
+			return await self.__offload(
+				(env_name, d.admin_host),
+				self.__inspect,
+				env_name,
+				d,
+				desired,
+				execute
+			)
+		return await self.__each(update, desired_states)
+
+	def close(self):
+		self.__executor.shutdown()
+		for agent in self.__agents.values():
+			agent.close()
@@ -1,8 +1,31 @@
 from tools.glassfish import asadmin
 from tools.glassfish import machine
+from tools.glassfish import readiness
+from tools import tracing
 
+import codecs
+import contextlib
+import docker.errors
+import hashlib
+import json
 import os
+import tarfile
+import threading
 import time
+import tools.scheduling.dag
+import urllib.request
+import uuid
+
+BUILD_DIGEST_LABEL = "pto.build.digest"
+GOLDEN_SOURCE_LABEL = "pto.golden.source"
+PUBLIC_KEY_LABEL = "pto.public-key"
+
+class ImageBuildError(Exception):
+
+	def __init__(self, tag, error):
+		super().__init__("Image {} build failed: {}".format(tag, error))
+		self.tag = tag
+		self.error = error
 
 class Machines:
 
@@ -11,10 +34,43 @@ class Machines:
 		self.__docker_client = params["docker-client"]
 		self.__image_version = params["image-version"]
 		self.__container_prefix = params["container-prefix"]
+		self.__build_context = params.get("build-context")
+		self.__golden_images = params.get("golden-images", False)
+		self.__golden_sources = {}
+		self.__golden_lock = threading.Lock()
 		self.__management_public_key_path = management_public_key_path
 		self.__management_private_key_path = management_private_key_path
 		self.__log_out = log_out
 		self.__machine_reg = {}
+		self.__registry = ContainerRegistry(
+			self.__docker_client,
+			self.__container_prefix
+		)
+		self.__events = ContainerEvents(
+			self.__docker_client,
+			params.get("health-check", False)
+		)
+		self.__ready_deadline = float(params.get(
+			"container-ready-deadline",
+			readiness.DEFAULT_DEADLINE
+		))
+		self.__machine_locks = {}
+		self.__machine_locks_lock = threading.Lock()
+		self.__ssh_pool = asadmin.SSHClientPool(
+			idle_timeout=int(params.get("ssh-idle-timeout", 300)),
+			ready_deadline=float(params.get(
+				"ssh-ready-deadline",
+				readiness.DEFAULT_DEADLINE
+			)),
+			port=int(params.get("ssh-port", 22))
+		)
+		self.__warm_pool = WarmPool(
+			int(params.get("warm-pool-size", 0)),
+			float(params.get("warm-pool-idle-timeout", 600)),
+			self.__spawn_standby,
+			self.__discard_standby,
+			log_out
+		)
 
 	def __image_tag(self, image_type):
 		return "miquelo/glassfish-4.1.1-{}:{}".format(
@@ -32,20 +88,23 @@ class Machines:
 
 	def __find_container(self, name):
 		container_name = self.__container_name(name)
-		cont_list = self.__docker_client.containers(all=True, filters={
-			"name": container_name
-		})
+		cont = self.__registry.find(container_name)
 		return Container(
-			self.__docker_client,
-			cont_list[0],
-			self.__public_key_target_path(container_name),
+			self.__registry,
+			self.__events,
+			cont,
+			self.__public_key_target_path(cont),
 			self.__management_private_key_path
-		) if len(cont_list) > 0 else None
+		) if cont is not None else None
 
-	def __create_container(self, name, image_type, user_path,
+	def __create_container(self, name, image_tag, user_path,
 			authorized_key_paths):
 		container_name = self.__container_name(name)
-		public_key_target_path = self.__public_key_target_path(container_name)
+		public_key_name = "{}-{}.pem".format(
+			self.__container_prefix,
+			uuid.uuid4().hex
+		)
+		public_key_target_path = self.__public_key_file(public_key_name)
 		binds = {
 			public_key_target_path: {
 				"bind": self.__ssh_public_key_path(user_path),
@@ -66,56 +125,175 @@ class Machines:
 		host_config = self.__docker_client.create_host_config(
 			binds=binds
 		)
-		return Container(
-			self.__docker_client,
-			self.__docker_client.create_container(
-				image=self.__image_tag(image_type),
+		with tracing.span("docker.create", container=container_name):
+			cont = self.__docker_client.create_container(
+				image=image_tag,
 				name=container_name,
 				environment={
 					# "DOCKER_CONTAINER_NAME": name
 				},
+				labels={
+					PUBLIC_KEY_LABEL: public_key_name
+				},
 				host_config=host_config
+			)
+		return Container(
+			self.__registry,
+			self.__events,
+			self.__registry.created(
+				container_name,
+				cont["Id"],
+				image_tag,
+				{
+					PUBLIC_KEY_LABEL: public_key_name
+				}
 			),
 			public_key_target_path,
 			self.__management_private_key_path
 		)
 
-	def __machine_up(self, name, image_type, user_path,
-			authorized_key_paths=None):
-		if name in self.__machine_reg:
-			return self.__machine_reg[name]
+	def __machine_lock(self, name):
+		with self.__machine_locks_lock:
+			return self.__machine_locks.setdefault(name, threading.Lock())
 
-		cont = self.__find_container(name)
-		if cont is None:
-			cont = self.__create_container(
+	def __machine_up(self, name, image_type, user_path,
+			authorized_key_paths=None, golden_tag=None, prepare=None):
+		with self.__machine_lock(name):
+			return self.__machine_up_locked(
 				name,
 				image_type,
 				user_path,
-				authorized_key_paths
+				authorized_key_paths,
+				golden_tag,
+				prepare
 			)
-		elif cont.outdated(self.__image_tag(image_type)):
+
+	def __machine_up_locked(self, name, image_type, user_path,
+			authorized_key_paths, golden_tag, prepare):
+		if name in self.__machine_reg:
+			return self.__machine_reg[name]
+
+		image_tag = self.__image_tag(image_type)
+		create_tag = golden_tag if golden_tag is not None else image_tag
+		cont = self.__find_container(name)
+		if cont is not None and cont.outdated(image_tag, create_tag):
 			cont.remove()
+			cont = None
+		created = cont is None
+		if created and authorized_key_paths == self.__inst_key_paths():
+			cont = self.__claim_standby(name, create_tag)
+		if created and cont is None:
 			cont = self.__create_container(
 				name,
-				image_type,
+				create_tag,
 				user_path,
 				authorized_key_paths
 			)
 
-		running_cont = cont.running()
-		self.__machine_reg[name] = running_cont.container_machine()
+		running_cont = cont.running(self.__ready_deadline)
+		provisioned = golden_tag is not None \
+			and running_cont.image == golden_tag
+		if created and provisioned and prepare is not None:
+			prepare(running_cont)
+		self.__machine_reg[name] = running_cont.container_machine(
+			self.__ssh_pool,
+			provisioned
+		)
 		return self.__machine_reg[name]
 
-	def __public_key_target_path(self, container_name):
+	def __inst_key_paths(self):
+		cont = self.__registry.find(self.__container_name("appserver-das"))
+		if cont is None:
+			return None
+		return [
+			self.__management_public_key_path,
+			self.__public_key_target_path(cont)
+		]
+
+	def __spawn_standby(self):
+		name = "standby-{}".format(uuid.uuid4().hex[:12])
+		cont = self.__create_container(
+			name,
+			self.__image_tag("server"),
+			"/usr/lib/glassfish4",
+			self.__inst_key_paths()
+		)
+		running_cont = cont.running(self.__ready_deadline)
+		readiness.wait_ssh(
+			running_cont.ip_address,
+			self.__ssh_pool.port,
+			self.__ready_deadline
+		)
+		return Standby(
+			self.__container_name(name),
+			running_cont.cont,
+			time.time()
+		)
+
+	def __discard_standby(self, standby):
+		with tracing.span("docker.remove", container=standby.cont["Id"]):
+			self.__docker_client.remove_container(
+				container=standby.cont["Id"],
+				force=True
+			)
+		self.__registry.removed(standby.cont["Id"])
+		self.__remove_public_key_target(standby.cont)
+
+	def __adopt_standbys(self):
+		standbys = []
+		prefix = self.__container_name("standby-")
+		for name, cont in self.__registry.matching(prefix):
+			standby = Standby(name, cont, cont.get("Created", 0))
+			if cont["State"] == "running":
+				standbys.append(standby)
+			else:
+				self.__discard_standby(standby)
+		return standbys
+
+	def __claim_standby(self, name, image_tag):
+		standby = self.__warm_pool.claim(image_tag)
+		if standby is None:
+			return None
+		container_name = self.__container_name(name)
+		with tracing.span("docker.rename", container=container_name):
+			self.__docker_client.rename(
+				container=standby.cont["Id"],
+				name=container_name
+			)
+		return Container(
+			self.__registry,
+			self.__events,
+			self.__registry.renamed(standby.name, container_name),
+			self.__public_key_target_path(standby.cont),
+			self.__management_private_key_path
+		)
+
+	def __public_key_name(self, cont):
+		labels = cont.get("Labels") or {}
+		if PUBLIC_KEY_LABEL in labels:
+			return labels[PUBLIC_KEY_LABEL]
+		return "{}.pem".format(cont["Names"][0].lstrip("/"))
+
+	def __public_key_file(self, public_key_name):
 		path = os.path.expanduser("~/.docker-glassfish")
-		if not os.path.exists(path):
-			os.mkdir(path)
-		path = os.path.join(path, "{}.pem".format(container_name))
+		os.makedirs(path, exist_ok=True)
+		path = os.path.join(path, public_key_name)
 		if not os.path.exists(path):
 			f = open(path, "a")
 			f.close()
 		return path
 
+	def __public_key_target_path(self, cont):
+		return self.__public_key_file(self.__public_key_name(cont))
+
+	def __remove_public_key_target(self, cont):
+		path = os.path.join(
+			os.path.expanduser("~/.docker-glassfish"),
+			self.__public_key_name(cont)
+		)
+		if os.path.exists(path):
+			os.remove(path)
+
 	def __ssh_path(self, user_path, path):
 		return os.path.join(
 			os.path.join(user_path, ".ssh"),
@@ -134,89 +312,565 @@ class Machines:
 			path
 		)
 
-	def __build_image(self, image_type):
-		for line in self.__docker_client.build(
-			path="https://github.com/{}#{}:{}-{}".format(
+	def __context_path(self, image_type):
+		return os.path.join(
+			self.__build_context,
+			"image",
+			"glassfish-4.1.1-{}".format(image_type)
+		)
+
+	def __context_digest(self, path, parent_digest):
+		sha1 = hashlib.sha1()
+		if parent_digest is not None:
+			sha1.update(parent_digest.encode("UTF-8"))
+		for root, dirs, files in os.walk(path):
+			dirs.sort()
+			for name in sorted(files):
+				file_path = os.path.join(root, name)
+				sha1.update(b"\0")
+				sha1.update(os.path.relpath(file_path, path).encode("UTF-8"))
+				sha1.update(b"\0")
+				with open(file_path, "rb") as f:
+					for chunk in iter(lambda: f.read(1 << 20), b""):
+						sha1.update(chunk)
+		return sha1.hexdigest()
+
+	def __image_labels(self, tag):
+		try:
+			image = self.__docker_client.inspect_image(tag)
+		except docker.errors.NotFound:
+			return None
+		return (image.get("Config") or {}).get("Labels") or {}
+
+	def __image_digest(self, tag):
+		return (self.__image_labels(tag) or {}).get(BUILD_DIGEST_LABEL)
+
+	def __build_log(self, chunks):
+		decoder = json.JSONDecoder()
+		text = codecs.getincrementaldecoder("UTF-8")()
+		buf = ""
+		for chunk in chunks:
+			buf = (buf + text.decode(chunk)).lstrip()
+			while len(buf) > 0:
+				try:
+					entry, end = decoder.raw_decode(buf)
+				except ValueError:
+					break
+				yield entry
+				buf = buf[end:].lstrip()
+
+	def __build(self, tag, path, labels=None):
+		with tracing.span("docker.build", image=tag):
+			for entry in self.__build_log(self.__docker_client.build(
+				path=path,
+				tag=tag,
+				rm=True,
+				labels=labels
+			)):
+				if "error" in entry:
+					raise ImageBuildError(tag, entry["error"])
+				if "stream" in entry:
+					self.__log_out.write(entry["stream"])
+
+	def __build_image(self, image_type, parent_digest=None):
+		tag = self.__image_tag(image_type)
+		if self.__build_context is None:
+			self.__build(tag, "https://github.com/{}#{}:{}-{}".format(
 				"miquelo/docker-glassfish.git",
 				self.__branch_name(),
 				"image/glassfish-4.1.1",
 				image_type
-			),
-			tag=self.__image_tag(image_type),
-			rm=True
-		):
-			line_dict = eval(line.decode("UTF-8"))
-			if "stream" in line_dict:
-				self.__log_out.write(line_dict["stream"])
+			))
+			return None
+		path = self.__context_path(image_type)
+		digest = self.__context_digest(path, parent_digest)
+		if self.__image_digest(tag) == digest:
+			self.__log_out.write("Image {} is up to date\n".format(tag))
+			return digest
+		self.__build(tag, path, {
+			BUILD_DIGEST_LABEL: digest
+		})
+		return digest
+
+	def __fetch_build_context(self):
+		if os.path.isdir(self.__build_context):
+			return
+		url = "https://github.com/miquelo/docker-glassfish/archive/{}.tar.gz" \
+			.format(self.__branch_name())
+		self.__log_out.write("Fetching {} into {}\n".format(
+			url,
+			self.__build_context
+		))
+		fetching_path = "{}.{}".format(self.__build_context, os.getpid())
+		with tracing.span("docker.context", url=url):
+			with urllib.request.urlopen(url) as resp:
+				with tarfile.open(fileobj=resp, mode="r|gz") as archive:
+					for member in archive:
+						parts = member.name.split("/", 1)
+						if len(parts) < 2 or len(parts[1]) == 0:
+							continue
+						member.name = parts[1]
+						archive.extract(member, fetching_path, filter="data")
+		os.replace(fetching_path, self.__build_context)
 
 	def build_images(self):
-		self.__build_image("debian")
-		self.__build_image("server")
+		if self.__build_context is not None:
+			self.__fetch_build_context()
+		graph = tools.scheduling.dag.Graph()
+		graph.add("debian", lambda: self.__build_image("debian"))
+		graph.add(
+			"server",
+			lambda debian_digest: self.__build_image("server", debian_digest),
+			[ "debian" ]
+		)
+		return graph.run()
 
 	def asadmin(self, ip_address):
 		return asadmin.AsAdmin(
 			ip_address,
-			self.__management_private_key_path
+			self.__management_private_key_path,
+			self.__ssh_pool
 		)
 
 	def machine_das(self):
-		return self.__machine_up(
+		machine_das = self.__machine_up(
 			"appserver-das",
 			"server",
 			"/usr/lib/glassfish4", [
 				self.__management_public_key_path
 			]
 		)
+		self.__warm_pool.start(self.__adopt_standbys)
+		return machine_das
 
-	def machine_inst(self, name, authorized_das_key_paths=None):
+	def __golden_tag(self, domain_name):
+		return "{}-golden-{}:{}".format(
+			self.__container_prefix,
+			domain_name,
+			self.__image_version
+		)
+
+	def __golden_source(self, domain_name):
+		if not self.__golden_images or domain_name is None:
+			return None
+		with self.__golden_lock:
+			if domain_name not in self.__golden_sources:
+				labels = self.__image_labels(self.__golden_tag(domain_name))
+				if labels is None or GOLDEN_SOURCE_LABEL not in labels:
+					return None
+				self.__golden_sources[domain_name] = labels[GOLDEN_SOURCE_LABEL]
+			return self.__golden_sources[domain_name]
+
+	def __copy_agent(self, source_node_name, node_name):
+		def prepare(running_cont):
+			running_cont.execute([
+				"sh",
+				"-c",
+				"mkdir -p {1} && cp -a {0}/agent {1}/".format(
+					"/var/glassfish/nodes/{}".format(source_node_name),
+					"/var/glassfish/nodes/{}".format(node_name)
+				)
+			], user="glassfish")
+		return prepare
+
+	def machine_inst(self, name, authorized_das_key_paths=None,
+			domain_name=None):
 		authorized_key_paths = [
 			self.__management_public_key_path
 		]
 		if authorized_das_key_paths is not None:
 			authorized_key_paths.extend(authorized_das_key_paths)
+		source_node_name = self.__golden_source(domain_name)
+		if source_node_name is None:
+			return self.__machine_up(
+				"appserver-inst-{}".format(name),
+				"server",
+				"/usr/lib/glassfish4",
+				authorized_key_paths
+			)
 		return self.__machine_up(
 			"appserver-inst-{}".format(name),
 			"server",
 			"/usr/lib/glassfish4",
-			authorized_key_paths
+			authorized_key_paths,
+			self.__golden_tag(domain_name),
+			self.__copy_agent(source_node_name, name)
 		)
 
+	def remove_inst(self, name):
+		name = "appserver-inst-{}".format(name)
+		with self.__machine_lock(name):
+			self.__machine_reg.pop(name, None)
+			cont = self.__registry.find(self.__container_name(name))
+			if cont is not None:
+				self.__find_container(name).remove()
+				self.__remove_public_key_target(cont)
+
+	def golden_pending(self, domain_name):
+		return self.__golden_images \
+			and self.__golden_source(domain_name) is None
+
+	def commit_golden(self, domain_name, node_name):
+		if not self.__golden_images \
+				or self.__golden_source(domain_name) is not None:
+			return None
+		golden_tag = self.__golden_tag(domain_name)
+		repository, tag = golden_tag.rsplit(":", 1)
+		cont = self.__registry.find(self.__container_name(
+			"appserver-inst-{}".format(node_name)
+		))
+		with self.__golden_lock:
+			if domain_name in self.__golden_sources:
+				return None
+			with tracing.span("docker.commit", image=golden_tag):
+				self.__docker_client.commit(
+					container=cont["Id"],
+					repository=repository,
+					tag=tag,
+					changes="LABEL {}={}".format(GOLDEN_SOURCE_LABEL, node_name)
+				)
+			self.__golden_sources[domain_name] = node_name
+		return golden_tag
+
+	def close(self):
+		self.__warm_pool.close()
+		self.__events.close()
+		self.__ssh_pool.close()
+
+class ContainerRegistry:
+
+	def __init__(self, client, prefix):
+		self.__client = client
+		self.__prefix = prefix
+		self.__lock = threading.Lock()
+		self.__containers = None
+
+	@property
+	def client(self):
+		return self.__client
+
+	def __name(self, cont):
+		for name in cont["Names"]:
+			return name.lstrip("/")
+
+	def __list(self, filters):
+		with tracing.span("docker.containers", filters=filters):
+			return self.__client.containers(all=True, filters=filters)
+
+	def __index(self):
+		if self.__containers is None:
+			prefix = "{}-".format(self.__prefix)
+			self.__containers = {
+				self.__name(cont): cont
+				for cont in self.__list({ "name": prefix })
+				if self.__name(cont).startswith(prefix)
+			}
+		return self.__containers
+
+	def find(self, name):
+		with self.__lock:
+			cont = self.__index().get(name)
+			if cont is not None:
+				return cont
+			for cont in self.__list({ "name": name }):
+				if self.__name(cont) == name:
+					self.__containers[name] = cont
+					return cont
+			return None
+
+	def refresh(self, cont_id):
+		cont_list = self.__list({ "id": cont_id })
+		if len(cont_list) == 0:
+			self.removed(cont_id)
+			raise LookupError("Container {} no longer exists".format(
+				cont_id[:12]
+			))
+		with self.__lock:
+			self.__index()[self.__name(cont_list[0])] = cont_list[0]
+		return cont_list[0]
+
+	def created(self, name, cont_id, image, labels=None):
+		cont = {
+			"Id": cont_id,
+			"Names": [ "/{}".format(name) ],
+			"Image": image,
+			"Labels": labels or {},
+			"State": "created"
+		}
+		with self.__lock:
+			self.__index()[name] = cont
+		return cont
+
+	def matching(self, prefix):
+		with self.__lock:
+			return [
+				(name, cont)
+				for name, cont in self.__index().items()
+				if name.startswith(prefix)
+			]
+
+	def renamed(self, name, new_name):
+		with self.__lock:
+			cont = self.__index().pop(name)
+			cont["Names"] = [ "/{}".format(new_name) ]
+			self.__containers[new_name] = cont
+		return cont
+
+	def removed(self, cont_id):
+		with self.__lock:
+			index = self.__index()
+			for name, cont in list(index.items()):
+				if cont["Id"] == cont_id:
+					del index[name]
+
+class Standby:
+
+	def __init__(self, name, cont, created):
+		self.__name = name
+		self.__cont = cont
+		self.__created = created
+
+	@property
+	def name(self):
+		return self.__name
+
+	@property
+	def cont(self):
+		return self.__cont
+
+	@property
+	def image(self):
+		return self.__cont["Image"]
+
+	def age(self, now):
+		return now - self.__created
+
+class WarmPool:
+
+	def __init__(self, size, idle_timeout, spawn, discard, log_out):
+		self.__size = size
+		self.__idle_timeout = idle_timeout
+		self.__spawn = spawn
+		self.__discard = discard
+		self.__log_out = log_out
+		self.__standbys = []
+		self.__cond = threading.Condition()
+		self.__started = False
+		self.__closed = False
+
+	def __expired(self, now):
+		expired = [
+			standby
+			for standby in self.__standbys
+			if standby.age(now) > self.__idle_timeout
+		]
+		for standby in expired:
+			self.__standbys.remove(standby)
+		return expired
+
+	def __replenish(self):
+		while True:
+			with self.__cond:
+				if self.__closed:
+					return
+				expired = self.__expired(time.time())
+				missing = self.__size - len(self.__standbys)
+			for standby in expired:
+				self.__discard(standby)
+			if missing > 0:
+				try:
+					standby = self.__spawn()
+				except (EOFError, LookupError, OSError,
+						ContainerExitedError) as e:
+					self.__log_out.write("Standby container failed: {}\n".format(
+						e
+					))
+					standby = None
+				with self.__cond:
+					if standby is not None:
+						self.__standbys.append(standby)
+						self.__cond.notify_all()
+						continue
+			with self.__cond:
+				if not self.__closed:
+					self.__cond.wait(self.__idle_timeout / 2)
+
+	def start(self, adopt=None):
+		with self.__cond:
+			if self.__size <= 0 or self.__started:
+				return False
+			self.__started = True
+			if adopt is not None:
+				self.__standbys.extend(adopt())
+		threading.Thread(target=self.__replenish, daemon=True).start()
+		return True
+
+	def claim(self, image_tag):
+		with self.__cond:
+			now = time.time()
+			for standby in self.__standbys:
+				if standby.image == image_tag \
+						and standby.age(now) <= self.__idle_timeout:
+					self.__standbys.remove(standby)
+					self.__cond.notify_all()
+					return standby
+			return None
+
+	def close(self):
+		with self.__cond:
+			self.__closed = True
+			self.__cond.notify_all()
+
+class ContainerExitedError(Exception):
+
+	def __init__(self, cont_id, exit_code):
+		super().__init__("Container {} exited with code {}".format(
+			cont_id[:12],
+			exit_code
+		))
+		self.cont_id = cont_id
+		self.exit_code = exit_code
+
+class ContainerExecError(Exception):
+
+	def __init__(self, cont_id, cmd, exit_code, output):
+		super().__init__("Command {} failed in container {} with code {}".format(
+			" ".join(cmd),
+			cont_id[:12],
+			exit_code
+		))
+		self.cont_id = cont_id
+		self.cmd = cmd
+		self.exit_code = exit_code
+		self.output = output
+
+class ContainerReady:
+
+	def __init__(self, cont_id, health_check):
+		self.__cont_id = cont_id
+		self.__health_check = health_check
+		self.__event = threading.Event()
+		self.__phase = "start"
+		self.__error = None
+		self.__started = time.monotonic()
+
+	@property
+	def phase(self):
+		return self.__phase
+
+	def notify(self, action, attributes):
+		if action == "die":
+			self.fail(ContainerExitedError(
+				self.__cont_id,
+				attributes.get("exitCode")
+			))
+		elif action == "start" and self.__health_check:
+			self.__phase = "health"
+		elif action in ("start", "health_status: healthy"):
+			self.__event.set()
+
+	def fail(self, error):
+		self.__error = error
+		self.__event.set()
+
+	def wait(self, deadline):
+		with tracing.span("docker.ready", container=self.__cont_id) as span:
+			ready = self.__event.wait(deadline)
+			span.set(phase=self.__phase)
+		if not ready:
+			raise readiness.NotReadyError(
+				self.__cont_id[:12],
+				self.__phase,
+				time.monotonic() - self.__started
+			)
+		if self.__error is not None:
+			raise self.__error
+
+class ContainerEvents:
+
+	def __init__(self, client, health_check=False):
+		self.__health_check = health_check
+		self.__lock = threading.Lock()
+		self.__expected = {}
+		self.__closed = False
+		self.__stream = client.events(decode=True, filters={
+			"type": "container",
+			"event": [ "start", "health_status", "die" ]
+		})
+		threading.Thread(target=self.__dispatch, daemon=True).start()
+
+	def __dispatch(self):
+		try:
+			for event in self.__stream:
+				actor = event.get("Actor", {})
+				with self.__lock:
+					ready = self.__expected.get(actor.get("ID"))
+				if ready is not None:
+					ready.notify(
+						event.get("Action", event.get("status")),
+						actor.get("Attributes", {})
+					)
+		finally:
+			with self.__lock:
+				self.__closed = True
+				expected = list(self.__expected.values())
+			for ready in expected:
+				ready.fail(EOFError("Docker event stream closed"))
+
+	@contextlib.contextmanager
+	def expect(self, cont_id):
+		ready = ContainerReady(cont_id, self.__health_check)
+		with self.__lock:
+			if self.__closed:
+				ready.fail(EOFError("Docker event stream closed"))
+			else:
+				self.__expected[cont_id] = ready
+		try:
+			yield ready
+		finally:
+			with self.__lock:
+				self.__expected.pop(cont_id, None)
+
+	def close(self):
+		self.__stream.close()
+
 class Container:
 
-	def __init__(self, client, cont, public_key_target_path,
+	def __init__(self, registry, events, cont, public_key_target_path,
 			management_private_key_path):
-		self.__client = client
+		self.__registry = registry
+		self.__events = events
 		self.__cont = cont
 		self.__public_key_target_path = public_key_target_path
 		self.__management_private_key_path = management_private_key_path
 
-	def __refresh_cont(self):
-		cont_list = self.__client.containers(all=True, filters={
-			"id": self.__cont["Id"]
-		})
-		self.__cont = cont_list[0]
-
-	def outdated(self, image_tag):
+	def outdated(self, *image_tags):
 		cont_image_tag = self.__cont["Image"]
-		return image_tag != cont_image_tag # or image_tag.endswith(":latest")
+		return cont_image_tag not in image_tags # or image_tag.endswith(":latest")
 
-	def running(self):
-		self.__refresh_cont()
+	def running(self, ready_deadline=readiness.DEFAULT_DEADLINE):
+		if self.__cont["State"] != "created":
+			self.__cont = self.__registry.refresh(self.__cont["Id"])
 		if self.__cont["State"] != "running":
-			self.__client.start(container=self.__cont["Id"])
-			self.__refresh_cont()
+			with self.__events.expect(self.__cont["Id"]) as ready:
+				with tracing.span("docker.start", container=self.__cont["Id"]):
+					self.__registry.client.start(container=self.__cont["Id"])
+				ready.wait(ready_deadline)
+			self.__cont = self.__registry.refresh(self.__cont["Id"])
 		return RunningContainer(
-			self.__client,
+			self.__registry.client,
 			self.__cont,
 			self.__public_key_target_path,
 			self.__management_private_key_path
 		)
 
 	def remove(self):
-		self.__client.remove_container(
-			container=self.__cont["Id"],
-			force=True
-		)
+		with tracing.span("docker.remove", container=self.__cont["Id"]):
+			self.__registry.client.remove_container(
+				container=self.__cont["Id"],
+				force=True
+			)
+		self.__registry.removed(self.__cont["Id"])
 
 class RunningContainer:
 
@@ -231,9 +885,36 @@ class RunningContainer:
 		network = self.__cont["NetworkSettings"]["Networks"]["bridge"]
 		return network["IPAddress"]
 
-	def container_machine(self):
+	@property
+	def image(self):
+		return self.__cont["Image"]
+
+	@property
+	def ip_address(self):
+		return self.__ip_address()
+
+	@property
+	def cont(self):
+		return self.__cont
+
+	def execute(self, cmd, user=""):
+		with tracing.span("docker.exec", container=self.__cont["Id"]):
+			exec_id = self.__client.exec_create(
+				container=self.__cont["Id"],
+				cmd=cmd,
+				user=user
+			)
+			output = self.__client.exec_start(exec_id=exec_id)
+			exit_code = self.__client.exec_inspect(exec_id=exec_id)["ExitCode"]
+		if exit_code != 0:
+			raise ContainerExecError(self.__cont["Id"], cmd, exit_code, output)
+		return output
+
+	def container_machine(self, ssh_pool, provisioned=False):
 		return machine.Machine(
 			self.__ip_address(),
 			self.__public_key_target_path,
-			self.__management_private_key_path
+			self.__management_private_key_path,
+			ssh_pool,
+			provisioned
 		)
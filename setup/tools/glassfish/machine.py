@@ -3,10 +3,12 @@ from tools.glassfish import asadmin
 class Machine:
 
 	def __init__(self, ip_address, public_key_path,
-			management_private_key_path):
+			management_private_key_path, ssh_pool=None, provisioned=False):
 		self.__ip_address = ip_address
 		self.__public_key_path = public_key_path
 		self.__management_private_key_path = management_private_key_path
+		self.__ssh_pool = ssh_pool
+		self.__provisioned = provisioned
 
 	@property
 	def ip_address(self):
@@ -16,8 +18,17 @@ class Machine:
 	def public_key_path(self):
 		return self.__public_key_path
 
+	@property
+	def provisioned(self):
+		return self.__provisioned
+
+	@property
+	def ssh_port(self):
+		return self.__ssh_pool.port if self.__ssh_pool is not None else 22
+
 	def asadmin(self):
 		return asadmin.AsAdmin(
 			self.__ip_address,
-			self.__management_private_key_path
+			self.__management_private_key_path,
+			self.__ssh_pool
 		)
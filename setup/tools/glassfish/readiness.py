@@ -0,0 +1,155 @@
+import random
+import socket
+import time
+import urllib.error
+import urllib.request
+
+from tools import tracing
+
+DEFAULT_DEADLINE = 60.0
+
+class NotReadyError(LookupError):
+
+	def __init__(self, target, phase, elapsed, cause=None):
+		super().__init__("{} not ready after {:.1f}s at {} phase{}".format(
+			target,
+			elapsed,
+			phase,
+			": {}".format(cause) if cause is not None else ""
+		))
+		self.target = target
+		self.phase = phase
+		self.elapsed = elapsed
+		self.cause = cause
+
+class Backoff:
+
+	def __init__(self, initial=0.05, factor=2.0, maximum=2.0, jitter=0.5):
+		self.__initial = initial
+		self.__factor = factor
+		self.__maximum = maximum
+		self.__jitter = jitter
+
+	def delays(self):
+		delay = self.__initial
+		while True:
+			spread = delay * self.__jitter
+			yield max(0.0, delay + random.uniform(-spread, spread))
+			delay = min(delay * self.__factor, self.__maximum)
+
+class Readiness:
+
+	def __init__(self, target):
+		self.__target = target
+		self.__started = time.monotonic()
+		self.__phases = []
+		self.__attempts = 0
+		self.__phase = None
+		self.__finished = None
+
+	@property
+	def target(self):
+		return self.__target
+
+	@property
+	def attempts(self):
+		return self.__attempts
+
+	@property
+	def phases(self):
+		return list(self.__phases)
+
+	@property
+	def phase(self):
+		return self.__phase
+
+	@property
+	def elapsed(self):
+		if self.__finished is not None:
+			return self.__finished - self.__started
+		return time.monotonic() - self.__started
+
+	def attempt(self):
+		self.__attempts += 1
+		self.__phase = "connect"
+
+	def reached(self, phase):
+		self.__phase = phase
+		if phase not in (p for p, elapsed in self.__phases):
+			self.__phases.append((phase, self.elapsed))
+
+	def ready(self):
+		self.__finished = time.monotonic()
+
+	def __str__(self):
+		return "{} ready in {:.2f}s after {} attempts ({})".format(
+			self.__target,
+			self.elapsed,
+			self.__attempts,
+			", ".join(
+				"{} {:.2f}s".format(phase, elapsed)
+				for phase, elapsed in self.__phases
+			)
+		)
+
+def wait(target, probe, deadline=DEFAULT_DEADLINE, backoff=None):
+	readiness = Readiness(target)
+	delays = (backoff or Backoff()).delays()
+	while True:
+		readiness.attempt()
+		remaining = deadline - readiness.elapsed
+		try:
+			probe(readiness, max(remaining, 0.1))
+			readiness.ready()
+			return readiness
+		except OSError as e:
+			remaining = deadline - readiness.elapsed
+			if remaining <= 0:
+				raise NotReadyError(
+					target,
+					readiness.phase,
+					readiness.elapsed,
+					e
+				)
+			time.sleep(min(next(delays), remaining))
+
+def __ssh_banner_probe(host, port):
+	def probe(readiness, timeout):
+		with socket.create_connection((host, port), timeout=timeout) as sock:
+			readiness.reached("tcp")
+			sock.settimeout(timeout)
+			banner = sock.makefile("rb").readline(256)
+			if not banner.startswith(b"SSH-"):
+				raise ConnectionError("Unexpected SSH banner {!r}".format(
+					banner
+				))
+			readiness.reached("banner")
+	return probe
+
+def wait_ssh(host, port=22, deadline=DEFAULT_DEADLINE, backoff=None):
+	with tracing.span("readiness.ssh", host=host) as span:
+		ready = wait(
+			"{}:{}".format(host, port),
+			__ssh_banner_probe(host, port),
+			deadline,
+			backoff
+		)
+		span.set(attempts=ready.attempts)
+		return ready
+
+def __http_probe(url):
+	def probe(readiness, timeout):
+		try:
+			with urllib.request.urlopen(url, timeout=timeout):
+				readiness.reached("http")
+		except urllib.error.HTTPError as e:
+			readiness.reached("http")
+			if e.code == 404 or e.code >= 500:
+				raise
+	return probe
+
+def wait_http(url, deadline=DEFAULT_DEADLINE, backoff=None):
+	with tracing.span("readiness.http", url=url) as span:
+		ready = wait(url, __http_probe(url), deadline, backoff)
+		span.set(attempts=ready.attempts)
+		return ready
@@ -0,0 +1,306 @@
+import tools.scheduling.dag
+
+class Deployment:
+
+	def __init__(self, name, artifact, context_root=None, force=False,
+			batch_size=None, floor=0):
+		self.__name = name
+		self.__artifact = artifact
+		self.__context_root = context_root
+		self.__force = force
+		self.__batch_size = batch_size
+		self.__floor = floor
+
+	@property
+	def name(self):
+		return self.__name
+
+	@property
+	def artifact(self):
+		return self.__artifact
+
+	@property
+	def context_root(self):
+		return self.__context_root
+
+	@property
+	def force(self):
+		return self.__force
+
+	@property
+	def batch_size(self):
+		return self.__batch_size
+
+	@property
+	def floor(self):
+		return self.__floor
+
+class DesiredCluster:
+
+	def __init__(self, name, running=True):
+		self.__name = name
+		self.__running = running
+		self.__config = {}
+		self.__instances = {}
+		self.__deployments = []
+
+	@property
+	def name(self):
+		return self.__name
+
+	@property
+	def running(self):
+		return self.__running
+
+	@property
+	def config(self):
+		return self.__config
+
+	@property
+	def instances(self):
+		return self.__instances
+
+	@property
+	def deployments(self):
+		return self.__deployments
+
+	def set_config(self, resource, name, value):
+		self.__config.setdefault(resource, {})[name] = value
+
+	def add_instance(self, name, node_name):
+		self.__instances[name] = node_name
+
+	def add_deployment(self, deployment):
+		self.__deployments.append(deployment)
+
+class DesiredState:
+
+	def __init__(self):
+		self.__nodes = []
+		self.__clusters = []
+
+	@property
+	def nodes(self):
+		return self.__nodes
+
+	@property
+	def clusters(self):
+		return self.__clusters
+
+	def add_node(self, name):
+		self.__nodes.append(name)
+
+	def add_cluster(self, cluster):
+		self.__clusters.append(cluster)
+
+class Action:
+
+	def __init__(self, key, description, fn, deps=()):
+		self.__key = key
+		self.__description = description
+		self.__fn = fn
+		self.__deps = tuple(deps)
+
+	@property
+	def key(self):
+		return self.__key
+
+	@property
+	def description(self):
+		return self.__description
+
+	@property
+	def deps(self):
+		return self.__deps
+
+	def __call__(self, *dep_results):
+		return self.__fn()
+
+class Plan:
+
+	def __init__(self, actions):
+		self.__actions = actions
+
+	def __len__(self):
+		return len(self.__actions)
+
+	def __iter__(self):
+		return iter(self.__actions)
+
+	def __str__(self):
+		if len(self.__actions) == 0:
+			return "No changes"
+		return "\n".join(action.description for action in self.__actions)
+
+	def execute(self, max_workers=8):
+		graph = tools.scheduling.dag.Graph()
+		for action in self.__actions:
+			graph.add(
+				action.key,
+				action,
+				[dep for dep in action.deps if dep in graph]
+			)
+		return graph.run(max_workers)
+
+def __cluster_key(name):
+	return "cluster:{}".format(name)
+
+def __cluster_actions(mgd_domain, topology, desired):
+	name = desired.name
+	cluster = mgd_domain.cluster(name)
+	exists = name in topology.cluster_names()
+	actions = []
+	if not exists:
+		actions.append(Action(
+			__cluster_key(name),
+			"+ cluster {}".format(name),
+			lambda: mgd_domain.create_cluster(name)
+		))
+
+	for resource, values in desired.config.items():
+		live = cluster.config(resource) if exists else {}
+		changed = {
+			attr: value
+			for attr, value in values.items()
+			if live.get(attr) != value
+		}
+		if len(changed) > 0:
+			actions.append(Action(
+				"config:{}:{}".format(name, resource),
+				"\n".join(
+					"~ config {} {}.{}: {} -> {}".format(
+						name,
+						resource,
+						attr,
+						live.get(attr),
+						value
+					)
+					for attr, value in changed.items()
+				),
+				lambda resource=resource, changed=changed:
+					cluster.configure(resource, changed),
+				[ __cluster_key(name) ]
+			))
+
+	servers = topology.server_names()
+	for inst_name, node_name in desired.instances.items():
+		if inst_name not in servers:
+			actions.append(Action(
+				"instance:{}".format(inst_name),
+				"+ instance {} on {} in {}".format(inst_name, node_name, name),
+				lambda inst_name=inst_name, node_name=node_name:
+					cluster.create_instance(inst_name, node_name),
+				[ "nodes", __cluster_key(name) ]
+			))
+	if exists:
+		for inst_name in topology.cluster_servers(name):
+			if inst_name not in desired.instances:
+				actions.append(Action(
+					"delete-instance:{}".format(inst_name),
+					"- instance {} in {}".format(inst_name, name),
+					lambda inst_name=inst_name:
+						cluster.delete_instance(inst_name)
+				))
+
+	prepared = [ action.key for action in actions ]
+	for deployment in desired.deployments:
+		version = cluster.application_version(deployment.name) \
+			if exists else None
+		if version is None:
+			change = "+ deploy {} to {}".format(deployment.name, name)
+		elif deployment.force:
+			change = "~ redeploy {} to {} (forced)".format(
+				deployment.name,
+				name
+			)
+		else:
+			digest = deployment.artifact.digest()
+			live_digest = cluster.application_digest(deployment.name)
+			if live_digest == digest:
+				continue
+			change = "~ redeploy {} to {} ({} -> {})".format(
+				deployment.name,
+				name,
+				live_digest,
+				digest
+			)
+		if version is not None and deployment.batch_size is not None:
+			actions.append(Action(
+				"deploy:{}:{}".format(name, deployment.name),
+				"{} in batches of {}".format(change, deployment.batch_size),
+				lambda deployment=deployment: cluster.rolling_deploy(
+					deployment.name,
+					deployment.artifact,
+					deployment.context_root,
+					deployment.batch_size,
+					deployment.floor,
+					force=True
+				),
+				prepared
+			))
+			continue
+		actions.append(Action(
+			"deploy:{}:{}".format(name, deployment.name),
+			change,
+			lambda deployment=deployment: cluster.deploy(
+				deployment.name,
+				deployment.artifact,
+				deployment.context_root,
+				True
+			),
+			prepared
+		))
+
+	if desired.running:
+		states = cluster.instance_states() if exists else {}
+		stopped = [
+			inst_name
+			for inst_name in desired.instances
+			if states.get(inst_name) != "RUNNING"
+		]
+		if len(stopped) > 0:
+			actions.append(Action(
+				"start:{}".format(name),
+				"> start cluster {} ({})".format(name, ", ".join(stopped)),
+				cluster.start,
+				[ action.key for action in actions ]
+			))
+	return actions
+
+def plan(mgd_domain, desired):
+	topology = mgd_domain.topology()
+	actions = []
+	nodes = topology.node_names()
+	missing = [ name for name in desired.nodes if name not in nodes ]
+	if len(missing) > 0:
+		actions.append(Action(
+			"nodes",
+			"\n".join("+ node {}".format(name) for name in missing),
+			lambda: mgd_domain.create_nodes(missing)
+		))
+	for cluster in desired.clusters:
+		actions.extend(__cluster_actions(mgd_domain, topology, cluster))
+	deleted = [
+		action.key.split(":", 1)[1]
+		for action in actions
+		if action.key.startswith("delete-instance:")
+	]
+	orphaned = sorted(set(
+		topology.server_node(inst_name)
+		for inst_name in deleted
+		if topology.server_node(inst_name) not in desired.nodes
+		and all(
+			server_name in deleted
+			for server_name in topology.node_servers(
+				topology.server_node(inst_name)
+			)
+		)
+	))
+	if len(orphaned) > 0:
+		actions.append(Action(
+			"delete-nodes",
+			"\n".join("- node {}".format(name) for name in orphaned),
+			lambda: mgd_domain.delete_nodes(orphaned),
+			[ "delete-instance:{}".format(name) for name in deleted ]
+		))
+	return Plan(actions)
@@ -0,0 +1,102 @@
+import os
+import time
+import uuid
+
+class MultipartEncoder:
+
+	def __init__(self, fields=None, files=None, chunk_size=1 << 16,
+			progress=None):
+		self.__boundary = uuid.uuid4().hex
+		self.__chunk_size = chunk_size
+		self.__progress = progress
+		self.__parts = []
+		for name, value in (fields or {}).items():
+			self.__parts.append(self.__header(name) + "\r\n{}\r\n".format(
+				value
+			).encode("UTF-8"))
+		for name, (file_name, f, content_type) in (files or {}).items():
+			self.__parts.append(self.__header(
+				name,
+				file_name,
+				content_type or "application/octet-stream"
+			) + b"\r\n")
+			self.__parts.append(f)
+			self.__parts.append(b"\r\n")
+		self.__parts.append("--{}--\r\n".format(
+			self.__boundary
+		).encode("UTF-8"))
+		self.__length = sum(self.__part_length(part) for part in self.__parts)
+		self.__part = 0
+		self.__offset = 0
+		self.__sent = 0
+		self.__started = None
+
+	def __header(self, name, file_name=None, content_type=None):
+		header = "--{}\r\nContent-Disposition: form-data; name=\"{}\"".format(
+			self.__boundary,
+			name
+		)
+		if file_name is not None:
+			header = "{}; filename=\"{}\"".format(header, file_name)
+		if content_type is not None:
+			header = "{}\r\nContent-Type: {}".format(header, content_type)
+		return "{}\r\n".format(header).encode("UTF-8")
+
+	def __part_length(self, part):
+		if isinstance(part, bytes):
+			return len(part)
+		return os.fstat(part.fileno()).st_size - part.tell()
+
+	@property
+	def content_type(self):
+		return "multipart/form-data; boundary={}".format(self.__boundary)
+
+	@property
+	def sent(self):
+		return self.__sent
+
+	@property
+	def elapsed(self):
+		if self.__started is None:
+			return 0.0
+		return time.monotonic() - self.__started
+
+	@property
+	def throughput(self):
+		elapsed = self.elapsed
+		return self.__sent / elapsed if elapsed > 0 else 0.0
+
+	def __len__(self):
+		return self.__length
+
+	def __iter__(self):
+		chunk = self.read(self.__chunk_size)
+		while len(chunk) > 0:
+			yield chunk
+			chunk = self.read(self.__chunk_size)
+
+	def read(self, size=-1):
+		if self.__started is None:
+			self.__started = time.monotonic()
+		if size is None or size < 0:
+			size = self.__length - self.__sent
+		chunks = []
+		while size > 0 and self.__part < len(self.__parts):
+			part = self.__parts[self.__part]
+			if isinstance(part, bytes):
+				data = part[self.__offset:self.__offset + size]
+				self.__offset += len(data)
+				if self.__offset >= len(part):
+					self.__part += 1
+					self.__offset = 0
+			else:
+				data = part.read(min(size, self.__chunk_size))
+				if len(data) == 0:
+					self.__part += 1
+			chunks.append(data)
+			size -= len(data)
+		chunk = b"".join(chunks)
+		self.__sent += len(chunk)
+		if self.__progress is not None and len(chunk) > 0:
+			self.__progress(self)
+		return chunk
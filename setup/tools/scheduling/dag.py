@@ -0,0 +1,167 @@
+import concurrent.futures
+import time
+
+class TaskError(Exception):
+
+	def __init__(self, name, cause, run, pending, running=()):
+		super().__init__("Task {} failed: {}".format(name, cause))
+		self.name = name
+		self.cause = cause
+		self.run = run
+		self.pending = pending
+		self.running = running
+
+class Task:
+
+	def __init__(self, name, fn, deps):
+		self.__name = name
+		self.__fn = fn
+		self.__deps = tuple(deps)
+		self.started = None
+		self.finished = None
+		self.result = None
+		self.error = None
+
+	@property
+	def name(self):
+		return self.__name
+
+	@property
+	def deps(self):
+		return self.__deps
+
+	@property
+	def duration(self):
+		return self.finished - self.started
+
+	def __call__(self, dep_results):
+		self.started = time.monotonic()
+		try:
+			self.result = self.__fn(*dep_results)
+			return self.result
+		except Exception as e:
+			self.error = e
+			raise
+		finally:
+			self.finished = time.monotonic()
+
+class Run:
+
+	def __init__(self, tasks, started):
+		self.__tasks = tasks
+		self.__started = started
+		self.__finished = time.monotonic()
+
+	@property
+	def elapsed(self):
+		return self.__finished - self.__started
+
+	@property
+	def results(self):
+		return {
+			name: task.result
+			for name, task in self.__tasks.items()
+			if task.finished is not None and task.error is None
+		}
+
+	def duration(self, name):
+		return self.__tasks[name].duration
+
+	def critical_path(self):
+		done = [
+			task for task in self.__tasks.values()
+			if task.finished is not None
+		]
+		if len(done) == 0:
+			return []
+		task = max(done, key=lambda t: t.finished)
+		path = [task.name]
+		while len(task.deps) > 0:
+			task = max(
+				(self.__tasks[dep] for dep in task.deps),
+				key=lambda t: t.finished
+			)
+			path.append(task.name)
+		path.reverse()
+		return path
+
+	def __str__(self):
+		return "Finished in {:.2f}s, critical path: {}".format(
+			self.elapsed,
+			" -> ".join(
+				"{} ({:.2f}s)".format(name, self.duration(name))
+				for name in self.critical_path()
+			)
+		)
+
+class Graph:
+
+	def __init__(self):
+		self.__tasks = {}
+
+	def __len__(self):
+		return len(self.__tasks)
+
+	def __contains__(self, name):
+		return name in self.__tasks
+
+	def add(self, name, fn, deps=()):
+		if name in self.__tasks:
+			raise ValueError("Task {} already added".format(name))
+		for dep in deps:
+			if dep not in self.__tasks:
+				raise LookupError("Task {} depends on unknown task {}".format(
+					name,
+					dep
+				))
+		self.__tasks[name] = Task(name, fn, deps)
+		return name
+
+	def run(self, max_workers=8):
+		started = time.monotonic()
+		tasks = self.__tasks
+		waiting = {
+			name: set(task.deps)
+			for name, task in tasks.items()
+		}
+		running = {}
+		executor = concurrent.futures.ThreadPoolExecutor(
+			max_workers=max_workers
+		)
+		def submit_ready():
+			for name in [n for n, deps in waiting.items() if not deps]:
+				del waiting[name]
+				task = tasks[name]
+				running[executor.submit(task, [
+					tasks[dep].result for dep in task.deps
+				])] = name
+
+		try:
+			submit_ready()
+			while len(running) > 0:
+				done, pending = concurrent.futures.wait(
+					running,
+					return_when=concurrent.futures.FIRST_COMPLETED
+				)
+				for future in done:
+					name = running.pop(future)
+					cause = future.exception()
+					if cause is not None:
+						cancelled = [
+							running.pop(future)
+							for future in list(running)
+							if future.cancel()
+						]
+						raise TaskError(
+							name,
+							cause,
+							Run(tasks, started),
+							sorted(list(waiting) + cancelled),
+							sorted(running.values())
+						) from cause
+					for deps in waiting.values():
+						deps.discard(name)
+				submit_ready()
+		finally:
+			executor.shutdown(wait=len(running) == 0, cancel_futures=True)
+		return Run(tasks, started)
@@ -0,0 +1,141 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+class Span:
+
+	def __init__(self, name, attrs):
+		self.__name = name
+		self.__attrs = dict(attrs)
+		self.__thread = threading.get_ident()
+		self.__started = time.perf_counter()
+		self.__finished = None
+
+	@property
+	def name(self):
+		return self.__name
+
+	@property
+	def phase(self):
+		return self.__name.split(".", 1)[0]
+
+	@property
+	def attrs(self):
+		return self.__attrs
+
+	@property
+	def thread(self):
+		return self.__thread
+
+	@property
+	def started(self):
+		return self.__started
+
+	@property
+	def duration(self):
+		return self.__finished - self.__started
+
+	def set(self, **attrs):
+		self.__attrs.update(attrs)
+
+	def finish(self):
+		self.__finished = time.perf_counter()
+
+class Tracer:
+
+	def __init__(self):
+		self.__lock = threading.Lock()
+		self.__spans = []
+		self.__started = time.perf_counter()
+
+	@contextlib.contextmanager
+	def span(self, name, **attrs):
+		span = Span(name, attrs)
+		try:
+			yield span
+		except BaseException as e:
+			span.set(error=type(e).__name__)
+			raise
+		finally:
+			span.finish()
+			with self.__lock:
+				self.__spans.append(span)
+
+	def spans(self):
+		with self.__lock:
+			return list(self.__spans)
+
+	def __totals(self, spans, key):
+		totals = {}
+		for span in spans:
+			count, total, longest = totals.get(key(span), (0, 0.0, 0.0))
+			totals[key(span)] = (
+				count + 1,
+				total + span.duration,
+				max(longest, span.duration)
+			)
+		return sorted(
+			totals.items(),
+			key=lambda item: item[1][1],
+			reverse=True
+		)
+
+	def summary(self, spans=False):
+		lines = [ "{:<32} {:>6} {:>10} {:>10}".format(
+			"phase",
+			"calls",
+			"total (s)",
+			"max (s)"
+		) ]
+		all_spans = self.spans()
+		for phase, (count, total, longest) in self.__totals(
+			all_spans,
+			lambda span: span.phase
+		):
+			lines.append("{:<32} {:>6} {:>10.3f} {:>10.3f}".format(
+				phase,
+				count,
+				total,
+				longest
+			))
+			if not spans:
+				continue
+			for name, (count, total, longest) in self.__totals(
+				[ span for span in all_spans if span.phase == phase ],
+				lambda span: span.name
+			):
+				lines.append("  {:<30} {:>6} {:>10.3f} {:>10.3f}".format(
+					name,
+					count,
+					total,
+					longest
+				))
+		return "\n".join(lines)
+
+	def write_chrome_trace(self, path):
+		pid = os.getpid()
+		events = [
+			{
+				"name": span.name,
+				"cat": span.phase,
+				"ph": "X",
+				"ts": (span.started - self.__started) * 1e6,
+				"dur": span.duration * 1e6,
+				"pid": pid,
+				"tid": span.thread,
+				"args": {
+					name: str(value)
+					for name, value in span.attrs.items()
+				}
+			}
+			for span in self.spans()
+		]
+		with open(path, "w") as f:
+			json.dump({ "traceEvents": events }, f)
+
+tracer = Tracer()
+
+def span(name, **attrs):
+	return tracer.span(name, **attrs)
@@ -0,0 +1,88 @@
+import benchmark
+import benchmark.fleet
+import benchmark.local
+import benchmark.upload
+
+class Updater:
+
+	def __init__(self, config):
+		self.__node_counts = [
+			int(node_count)
+			for node_count in config.get(
+				name="bench-node-counts",
+				title="Benchmark topologies (comma separated node counts)",
+				def_value="1,10,50"
+			).split(",")
+		]
+		self.__rest_latency = float(config.get(
+			name="bench-rest-latency",
+			title="Benchmark REST latency in seconds",
+			def_value="0.0"
+		))
+		self.__jvm_startup = float(config.get(
+			name="bench-jvm-startup",
+			title="Benchmark asadmin JVM startup in seconds",
+			def_value="0.0"
+		))
+		self.__golden_images = config.get(
+			name="bench-golden-images",
+			title="Benchmark with golden node images",
+			ex_values="yes/no",
+			def_value="no"
+		) == "yes"
+		self.__warm_pool_size = int(config.get(
+			name="bench-warm-pool-size",
+			title="Benchmark warm pool size",
+			def_value="0"
+		))
+		self.__rolling_batch_size = int(config.get(
+			name="bench-rolling-batch-size",
+			title="Benchmark rolling redeploy batch size (0 skips it)",
+			def_value="0"
+		))
+		self.__upload_size = int(config.get(
+			name="bench-upload-size",
+			title="Benchmark streaming upload size in MiB (0 skips it)",
+			def_value="256"
+		))
+		self.__local_updater = config.get(
+			name="bench-local-updater",
+			title="Benchmark scaling through the local updater",
+			ex_values="yes/no",
+			def_value="no"
+		) == "yes"
+		self.__fleet = config.get(
+			name="bench-fleet",
+			title="Benchmark a fleet of two environments",
+			ex_values="yes/no",
+			def_value="no"
+		) == "yes"
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, tp):
+		pass
+
+	def plan(self):
+		print("Benchmark {} node(s), {}s REST latency, {}s JVM startup".format(
+			", ".join(str(node_count) for node_count in self.__node_counts),
+			self.__rest_latency,
+			self.__jvm_startup
+		))
+
+	def update(self):
+		if self.__upload_size > 0:
+			print(benchmark.upload.check(self.__upload_size << 20))
+		benchmark.suite(
+			self.__node_counts,
+			self.__rest_latency,
+			self.__jvm_startup,
+			self.__golden_images,
+			self.__warm_pool_size,
+			self.__rolling_batch_size
+		)
+		if self.__local_updater:
+			print(benchmark.local.check())
+		if self.__fleet:
+			print(benchmark.fleet.check())
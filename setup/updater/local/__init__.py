@@ -1,13 +1,15 @@
-import caviar
-import caviar.domain
 import docker
 import getpass
 import os
 import tools.artifacts.maven
+import tools.glassfish
+import tools.glassfish.readiness
+import tools.glassfish.state
+import tools.scheduling.dag
 
 class Updater:
 
-	def __init__(self, config):
+	def __init__(self, config, docker_client=None):
 		self.__management_public_key_path = config.get(
 			name="management-public-key",
 			title="Management public key",
@@ -43,7 +45,7 @@ class Updater:
 				self.__docker_certificate = config.get(
 					name="docker-certificate",
 					title="Docker certificate path",
-					def_value=self.__default_docker_certficate()
+					def_value=self.__default_docker_certificate()
 				)
 				self.__docker_key = config.get(
 					name="docker-key",
@@ -56,16 +58,78 @@ class Updater:
 			title="GlassFish image version",
 			def_value="latest"
 		)
+		self.__glassfish_build_context = config.get(
+			name="glassfish-build-context",
+			title="GlassFish images build context (remote builds uncached)",
+			def_value=os.path.expanduser(
+				"~/.cache/pto/docker-glassfish-{}".format(
+					self.__glassfish_image_version
+				)
+			)
+		)
 		self.__glassfish_container_prefix = config.get(
 			name="glassfish-container-prefix",
 			title="GlassFish container prefix",
 			def_value="pto-test"
 		)
+		self.__glassfish_ssh_port = config.get(
+			name="glassfish-ssh-port",
+			title="GlassFish containers SSH port",
+			def_value="22"
+		)
+		self.__glassfish_health_check = config.get(
+			name="glassfish-health-check",
+			title="Wait for the GlassFish image HEALTHCHECK on start",
+			ex_values="yes/no",
+			def_value="no"
+		) == "yes"
+		self.__glassfish_ready_deadline = config.get(
+			name="glassfish-ready-deadline",
+			title="Maximum seconds to wait for a GlassFish container to start",
+			def_value=str(tools.glassfish.readiness.DEFAULT_DEADLINE)
+		)
+		self.__glassfish_cluster_name = config.get(
+			name="glassfish-cluster-name",
+			title="GlassFish cluster name",
+			def_value="cluster-01"
+		)
+		self.__glassfish_debug_enabled = config.get(
+			name="glassfish-debug-enabled",
+			title="GlassFish cluster debugging is enabled",
+			ex_values="yes/no",
+			def_value="yes"
+		) == "yes"
+		self.__glassfish_golden_images = config.get(
+			name="glassfish-golden-images",
+			title="Create GlassFish nodes from a committed golden image",
+			ex_values="yes/no",
+			def_value="no"
+		) == "yes"
+		self.__glassfish_warm_pool_size = config.get(
+			name="glassfish-warm-pool-size",
+			title="Number of standby GlassFish node containers",
+			def_value="0"
+		)
+		self.__glassfish_warm_pool_idle_timeout = config.get(
+			name="glassfish-warm-pool-idle-timeout",
+			title="Maximum age in seconds of a standby node container",
+			def_value="600"
+		)
 		self.__glassfish_instance_count = config.get(
 			name="glassfish-instance-count",
 			title="Number of available instances by GlassFish",
 			def_value="1"
 		)
+		self.__glassfish_rolling_batch_size = config.get(
+			name="glassfish-rolling-batch-size",
+			title="Instances redeployed at once (0 redeploys all together)",
+			def_value="0"
+		)
+		self.__glassfish_serving_floor = config.get(
+			name="glassfish-serving-floor",
+			title="Minimum number of instances serving during a redeploy",
+			def_value="0"
+		)
 
 		self.__domain_name = config.get(
 			name="domain-name",
@@ -78,6 +142,12 @@ class Updater:
 			secret=True
 		)
 
+		self.__pto_version = config.get(
+			name="pto-version",
+			title="PTO artifacts version (version, range, LATEST or RELEASE)",
+			def_value="LATEST"
+		)
+
 		self.__domain_admin_name = config.get(
 			name="domain-admin-name",
 			title="Domain administrator name",
@@ -89,12 +159,13 @@ class Updater:
 			secret=True
 		)
 
-		self.__docker_client = None
+		self.__docker_client = docker_client
+		self.__docker_client_owned = docker_client is None
 		self.__glassfish_agent = None
 
 		self.__repo = tools.artifacts.maven.LocalRepository()
 
-	def __enter__(self):
+	def __create_docker_client(self):
 		if self.__docker_config_environment:
 			base_url = self.__docker_env_endpoint()
 			tls = docker.tls.TLSConfig(
@@ -111,28 +182,46 @@ class Updater:
 					self.__docker_key
 				)
 			) if self.__docker_tls_enabled else None
-		self.__docker_client = docker.APIClient(
+		return docker.APIClient(
 			base_url=base_url,
 			tls=tls,
 			version="1.23"
 		)
 
-		self.__glassfish_env = caviar.domain.environment(
-			"caviar.machinery.docker",
+	def __enter__(self):
+		if self.__docker_client is None:
+			self.__docker_client = self.__create_docker_client()
+		self.__glassfish_agent = tools.glassfish.restore(
+			"docker",
 			{
 				"docker-client": self.__docker_client,
+				"image-version": self.__glassfish_image_version,
+				"build-context": self.__glassfish_build_context
+				if self.__glassfish_build_context != "remote" else None,
 				"container-prefix": self.__glassfish_container_prefix,
-				"build-images": True
+				"ssh-port": int(self.__glassfish_ssh_port),
+				"health-check": self.__glassfish_health_check,
+				"container-ready-deadline": float(
+					self.__glassfish_ready_deadline
+				),
+				"golden-images": self.__glassfish_golden_images,
+				"warm-pool-size": int(self.__glassfish_warm_pool_size),
+				"warm-pool-idle-timeout": float(
+					self.__glassfish_warm_pool_idle_timeout
+				)
 			},
 			self.__management_public_key_path,
 			self.__management_private_key_path,
-			self.__domain_master_password
+			self.__domain_master_password,
+			build_images=True
 		)
 		return self
 
 	def __exit__(self, type, value, tp):
-		self.__glassfish_agent.close()
-		self.__docker_client.close()
+		if self.__glassfish_agent is not None:
+			self.__glassfish_agent.close()
+		if self.__docker_client_owned:
+			self.__docker_client.close()
 
 	def __default_management_public_key(self):
 		return os.path.expanduser("~/.ssh/id_rsa.pub")
@@ -183,51 +272,62 @@ class Updater:
 			self.__domain_name
 		)
 
-	def __configure(self, cluster):
-		cluster.deploy(
-			name="pto-ma-web",
-			artifact=self.__repo.artifact(
+	def __desired_state(self):
+		desired = tools.glassfish.state.DesiredState()
+		cluster = tools.glassfish.state.DesiredCluster(
+			self.__glassfish_cluster_name
+		)
+		cluster.set_config(
+			"java-config",
+			"debugEnabled",
+			"true" if self.__glassfish_debug_enabled else "false"
+		)
+		for i in range(1, int(self.__glassfish_instance_count) + 1):
+			node_name = "node-{:02d}".format(i)
+			desired.add_node(node_name)
+			cluster.add_instance("inst-{:02d}".format(i), node_name)
+		cluster.add_deployment(tools.glassfish.state.Deployment(
+			"pto-ma-web",
+			self.__repo.artifact(
 				group_id="net.preparatusopos.member",
 				artifact_id="pto-ma-web",
-				version="0.1.0-SNAPSHOT",
+				version=self.__pto_version,
 				packaging="war"
 			),
 			context_root="/member",
-			force=True
-		)
-		cluster.start()
-
-	def __domain_node(self, mgd_domain, name):
-		for node in mgd_domain.nodes():
-			if name == node.name:
-				return node
-		return mgd_domain.create_node(name)
-
-	def __domain_cluster(self, mgd_domain, name):
-		for cluster in mgd_domain.clusters():
-			if name == cluster.name:
-				return cluster
-		return mgd_domain.create_cluster(name)
-
-	def __domain_instance(self, node, name, cluster):
-		for inst in node.instances():
-			if name == inst.name:
-				return inst
-		return node.create_instance(name, cluster)
+			batch_size=int(self.__glassfish_rolling_batch_size) or None,
+			floor=int(self.__glassfish_serving_floor)
+		))
+		desired.add_cluster(cluster)
+		return desired
+
+	def plan(self):
+		with self.__glassfish_domain().manage(
+			self.__domain_admin_name,
+			self.__domain_admin_password
+		) as mgd_domain:
+			print(tools.glassfish.state.plan(
+				mgd_domain,
+				self.__desired_state()
+			))
 
 	def update(self):
-		mgd_domain = self.__glassfish_domain().manage(
+		with self.__glassfish_domain().manage(
 			self.__domain_admin_name,
 			self.__domain_admin_password
-		)
-
-		node01 = self.__domain_node(mgd_domain, "node-01")
-		node02 = self.__domain_node(mgd_domain, "node-02")
-		node03 = self.__domain_node(mgd_domain, "node-03")
-
-		cluster = self.__domain_cluster(mgd_domain, "cluster-01")
-		inst01 = self.__domain_instance(node01, "inst-01", cluster)
-		inst02 = self.__domain_instance(node02, "inst-02", cluster)
-		inst03 = self.__domain_instance(node03, "inst-03", cluster)
-
-		self.__configure(cluster)
+		) as mgd_domain:
+			plan = tools.glassfish.state.plan(
+				mgd_domain,
+				self.__desired_state()
+			)
+			print(plan)
+			try:
+				print(plan.execute())
+			except tools.scheduling.dag.TaskError as e:
+				print("Provisioning failed at {}, completed: {}, "
+					"still running: {}".format(
+						e.name,
+						", ".join(sorted(e.run.results)) or "none",
+						", ".join(e.running) or "none"
+					))
+				raise